@@ -1,25 +1,50 @@
 import os
-from datetime import datetime
+import gzip
+import tempfile
+from datetime import datetime, timedelta, timezone
 import time
+import threading
 
 from bioblend.galaxy import GalaxyInstance
-from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify, Response
-from werkzeug.security import generate_password_hash, check_password_hash
+from flask import Flask, Request, render_template, request, redirect, url_for, session, flash, jsonify, Response, make_response
+from werkzeug.middleware.proxy_fix import ProxyFix
+from sqlalchemy import and_, or_
+from sqlalchemy.exc import IntegrityError
 
 # Import config y modelos separados
 from config import Config
-from models import db, Usuario, Historia
+from models import db, Usuario, Historia, EstadisticaFastqc, ModuloFastqc, ResumenAlineamiento
 
 # Importar funciones de utilidad de Galaxy
-from galaxy_tools import ejecutar_fastqc, obtener_datasets_de_historia
+from galaxy_tools import ejecutar_fastqc, obtener_datasets_de_historia, descargar_dataset_en_bloques
+from fastqc_metrics import importar_metricas_fastqc, resumen_multimuestra
+from sam_resumen import resumir_sam
+from fasta_index import obtener_fasta_indexado, olvidar_fasta_indexado, parsear_region, IndiceFastaError
+from spool import SpoolSubidas, EspacioInsuficiente
+from captura_trafico import CapturaTrafico
+from seguridad import ServicioHash, LimitadorIntentos, ServidorOcupado
+from db_perfiles import activar_pragmas_sqlite, sesion_lectura
 
 # ---------------------------------------------------------
 # Inicializa Flask y base de datos (SQLAlchemy)
 # ---------------------------------------------------------
 app = Flask(__name__)
 app.config.from_object(Config)
+# Detrás de un proxy inverso, request.remote_addr pasa a ser la IP real del cliente (X-Forwarded-For)
+if Config.PROXIES_CONFIABLES:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=Config.PROXIES_CONFIABLES, x_proto=Config.PROXIES_CONFIABLES)
+if Config.DB_PERFIL == 'sqlite':
+    activar_pragmas_sqlite(Config.SQLITE_MMAP_MB, Config.SQLITE_BUSY_TIMEOUT_MS)
 db.init_app(app)
 
+# Con `python app.py`, los procesos del pool de hashing (forkserver/spawn) reimportan este
+# módulo como __mp_main__: los hilos de fondo solo se arrancan en el proceso web
+PROCESO_PRINCIPAL = __name__ != '__mp_main__'
+
+# Muestreo opcional del tráfico real a un JSONL (ver replay_trafico.py)
+if Config.CAPTURA_TRAFICO and PROCESO_PRINCIPAL:
+    CapturaTrafico(Config.CAPTURA_TRAFICO_ARCHIVO, Config.CAPTURA_TRAFICO_MUESTREO).registrar(app)
+
 # ---------------------------------------------------------
 # Conexión a Galaxy usando variables del config (.env)
 # ---------------------------------------------------------
@@ -28,10 +53,72 @@ gi = GalaxyInstance(
     key=Config.GALAXY_API_KEY
 )
 
+# ---------------------------------------------------------
+# Hashing de contraseñas en procesos aparte + límites de intentos
+# ---------------------------------------------------------
+servicio_hash = ServicioHash(
+    procesos=Config.HASH_PROCESOS,
+    max_pendientes=Config.HASH_MAX_PENDIENTES,
+    timeout=Config.HASH_TIMEOUT_SEGUNDOS,
+    metodo=Config.HASH_METODO
+)
+limitador_ip = LimitadorIntentos(Config.LOGIN_MAX_INTENTOS_IP, ventana=60)
+limitador_usuario = LimitadorIntentos(Config.LOGIN_MAX_FALLOS_USUARIO, ventana=15 * 60)
+
 # Carpeta temporal para archivos subidos
 TEMP_FOLDER = 'temp'
 os.makedirs(TEMP_FOLDER, exist_ok=True)
 
+# Spool gestionado: rutas únicas, cuota de disco y limpieza tras la ingesta en Galaxy
+spool = SpoolSubidas(
+    TEMP_FOLDER,
+    cuota_bytes=Config.SPOOL_CUOTA_MB * 1024 * 1024,
+    ttl_segundos=Config.SPOOL_TTL_SEGUNDOS,
+    espera_maxima=Config.SPOOL_ESPERA_SEGUNDOS,
+    directorio_tmpfs=Config.SPOOL_TMPFS_DIR,
+    umbral_tmpfs=Config.SPOOL_TMPFS_UMBRAL_MB * 1024 * 1024
+)
+if PROCESO_PRINCIPAL:
+    spool.iniciar_barrido(Config.SPOOL_BARRIDO_SEGUNDOS)
+
+class RequestSubidas(Request):
+    """
+    En /subir_archivo, Werkzeug escribe cada archivo del formulario directamente en el spool
+    (sin copia previa en $TMPDIR), con la cuota aplicada mientras llega el cuerpo.
+    Si el spool no admite la subida, error_spool guarda el motivo y el formulario queda vacío.
+    """
+    error_spool = None
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        if self.endpoint != 'subir_archivo':
+            return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+        flujo = spool.abrir(filename, total_content_length)
+        self.__dict__.setdefault('flujos_spool', []).append(flujo)
+        return flujo
+
+    def _load_form_data(self):
+        try:
+            super()._load_form_data()
+        except EspacioInsuficiente as e:
+            self.error_spool = e
+            self.__dict__['form'] = self.parameter_storage_class()
+            self.__dict__['files'] = self.parameter_storage_class()
+
+    def close(self):
+        # Las subidas que la vista no conservó (rechazadas o con error) se borran al terminar
+        for flujo in self.__dict__.get('flujos_spool', []):
+            flujo.liberar_si_pendiente()
+        super().close()
+
+app.request_class = RequestSubidas
+
+# Copias locales de genomas de referencia (se descargan e indexan una sola vez)
+CACHE_REFERENCIAS = os.path.join('cache', 'referencias')
+os.makedirs(CACHE_REFERENCIAS, exist_ok=True)
+EXTENSIONES_FASTA = {'fasta', 'fa'}
+bloqueos_referencias = {}
+bloqueo_referencias = threading.Lock()
+
 # ---------------------------------------------------------
 # Modelos de Base de Datos (SQLAlchemy)
 # ---------------------------------------------------------
@@ -43,6 +130,8 @@ class Analisis(db.Model):
     input_file = db.Column(db.String(300))
     status = db.Column(db.String(50), default='pendiente')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Historial y métricas filtran por usuario y ordenan/filtran por fecha
+    __table_args__ = (db.Index('ix_analisis_user_id_created_at', 'user_id', 'created_at'),)
 
     def to_dict(self):
         return {
@@ -57,10 +146,10 @@ class Analisis(db.Model):
 class Resultado(db.Model):
     __tablename__ = 'resultados'
     id = db.Column(db.Integer, primary_key=True)
-    analisis_id = db.Column(db.Integer, db.ForeignKey('analisis.id'), nullable=False)
+    analisis_id = db.Column(db.Integer, db.ForeignKey('analisis.id'), nullable=False, index=True)
     galaxy_output_id = db.Column(db.String(255), nullable=False)
     output_type = db.Column(db.String(50), nullable=False) # e.g., 'html', 'txt'
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
 
     def to_dict(self):
         return {
@@ -97,26 +186,32 @@ def guardar_resultado(analisis_id: int, galaxy_output_id: str, output_type: str)
     db.session.commit()
     return r
 
+def tabla_inexistente(error: Exception) -> bool:
+    """True si el error se debe a que las tablas aún no existen (PostgreSQL o SQLite)."""
+    mensaje = str(error)
+    return ("relation" in mensaje and "does not exist" in mensaje) or "no such table" in mensaje
+
 def obtener_analisis_con_resultados(user_id: int):
     """Obtiene todos los análisis de un usuario que tienen resultados."""
     try:
-        # Obtener análisis del usuario
-        analisis_list = Analisis.query.filter_by(user_id=user_id).order_by(Analisis.created_at.desc()).all()
-        
-        output = []
-        for a in analisis_list:
-            # Obtener resultados asociados
-            resultados = Resultado.query.filter_by(analisis_id=a.id).all()
-            
-            # Solo incluir análisis que tienen resultados
-            if resultados:
-                a_dict = a.to_dict()
-                a_dict['resultados'] = [r.to_dict() for r in resultados]
-                output.append(a_dict)
-        return output
+        with sesion_lectura(db) as sesion:
+            # Obtener análisis del usuario
+            analisis_list = sesion.query(Analisis).filter_by(user_id=user_id).order_by(Analisis.created_at.desc()).all()
+
+            output = []
+            for a in analisis_list:
+                # Obtener resultados asociados
+                resultados = sesion.query(Resultado).filter_by(analisis_id=a.id).all()
+
+                # Solo incluir análisis que tienen resultados
+                if resultados:
+                    a_dict = a.to_dict()
+                    a_dict['resultados'] = [r.to_dict() for r in resultados]
+                    output.append(a_dict)
+            return output
     except Exception as e:
         # Manejar el error si la tabla no existe (ej. al iniciar por primera vez)
-        if "relation" in str(e) and "does not exist" in str(e):
+        if tabla_inexistente(e):
             flash("Advertencia: Las tablas de la base de datos no existen. Por favor, asegúrese de que la aplicación se haya iniciado correctamente para crear las tablas.", "warning")
             return []
         raise e
@@ -128,15 +223,106 @@ def obtener_resultado_por_id(resultado_id: int):
 def obtener_historial_usuario(user_id: int):
     """Obtiene todos los análisis de un usuario ordenados por fecha descendente."""
     try:
-        rows = Analisis.query.filter_by(user_id=user_id).order_by(Analisis.created_at.desc()).all()
-        return [r.to_dict() for r in rows]
+        with sesion_lectura(db) as sesion:
+            rows = sesion.query(Analisis).filter_by(user_id=user_id).order_by(Analisis.created_at.desc()).all()
+            return [r.to_dict() for r in rows]
     except Exception as e:
         # Manejar el error si la tabla no existe (ej. al iniciar por primera vez)
-        if "relation" in str(e) and "does not exist" in str(e):
+        if tabla_inexistente(e):
             flash("Advertencia: Las tablas de la base de datos no existen. Por favor, asegúrese de que la aplicación se haya iniciado correctamente para crear las tablas.", "warning")
             return []
         raise e
 
+def buscar_metricas_fastqc(user_id: int, modulo: str = None, estado: str = None, desde: datetime = None, hasta: datetime = None,
+                           analisis_id: int = None):
+    """Filtra muestras FastQC del usuario por estado de módulo y fecha (consulta SQL indexada)."""
+    with sesion_lectura(db) as sesion:
+        return _buscar_metricas_fastqc(sesion, user_id, modulo, estado, desde, hasta, analisis_id)
+
+def _buscar_metricas_fastqc(sesion, user_id, modulo, estado, desde, hasta, analisis_id):
+    consulta = sesion.query(
+        Resultado.id, Resultado.created_at, EstadisticaFastqc.archivo,
+        EstadisticaFastqc.total_secuencias, EstadisticaFastqc.gc_porcentaje
+    ).join(Analisis, Analisis.id == Resultado.analisis_id) \
+     .join(EstadisticaFastqc, EstadisticaFastqc.resultado_id == Resultado.id) \
+     .filter(Analisis.user_id == user_id)
+
+    if modulo or estado:
+        # EXISTS en vez de JOIN: una muestra con varios módulos coincidentes sale una sola vez
+        coincidencia = sesion.query(ModuloFastqc).filter(ModuloFastqc.resultado_id == Resultado.id)
+        if modulo:
+            coincidencia = coincidencia.filter(ModuloFastqc.modulo == modulo)
+        if estado:
+            coincidencia = coincidencia.filter(ModuloFastqc.estado == estado)
+        consulta = consulta.filter(coincidencia.exists())
+    if analisis_id:
+        consulta = consulta.filter(Resultado.analisis_id == analisis_id)
+    if desde:
+        consulta = consulta.filter(Resultado.created_at >= desde)
+    if hasta:
+        consulta = consulta.filter(Resultado.created_at < hasta)
+
+    return [{
+        'resultado_id': r.id,
+        'fecha': r.created_at.isoformat(),
+        'archivo': r.archivo,
+        'total_secuencias': r.total_secuencias,
+        'gc_porcentaje': r.gc_porcentaje
+    } for r in consulta.order_by(Resultado.created_at.desc()).all()]
+
+def obtener_referencia_local(dataset_id: str):
+    """Descarga (solo la primera vez) un FASTA de Galaxy a la caché local y lo devuelve indexado."""
+    ruta = os.path.join(CACHE_REFERENCIAS, f"{os.path.basename(dataset_id)}.fa")
+    with bloqueo_referencias:
+        bloqueo = bloqueos_referencias.setdefault(ruta, threading.Lock())
+
+    # Un solo hilo descarga cada referencia; el resto espera y reutiliza la copia
+    with bloqueo:
+        if not os.path.exists(ruta):
+            extension = gi.datasets.show_dataset(dataset_id).get('file_ext')
+            if extension not in EXTENSIONES_FASTA:
+                raise IndiceFastaError(f"El dataset está en formato {extension}, se requiere FASTA")
+
+            # Nombre temporal único: otro proceso puede estar descargando la misma referencia
+            descriptor, ruta_parcial = tempfile.mkstemp(dir=CACHE_REFERENCIAS, suffix='.descarga')
+            os.close(descriptor)
+            try:
+                gi.datasets.download_dataset(dataset_id, file_path=ruta_parcial, use_default_filename=False)
+                os.replace(ruta_parcial, ruta)
+            finally:
+                if os.path.exists(ruta_parcial):
+                    os.remove(ruta_parcial)
+            liberar_cache_referencias(conservar=ruta)
+        else:
+            # atime marca el último uso (mtime no se toca: invalidaría el .fai)
+            os.utime(ruta, (time.time(), os.path.getmtime(ruta)))
+    return obtener_fasta_indexado(ruta)
+
+def liberar_cache_referencias(conservar: str):
+    """Borra las referencias usadas hace más tiempo hasta quedar bajo CACHE_REFERENCIAS_MAX_MB."""
+    limite = Config.CACHE_REFERENCIAS_MAX_MB * 1024 * 1024
+    grupos = {}
+    for nombre in os.listdir(CACHE_REFERENCIAS):
+        base = nombre.split('.fa', 1)[0] + '.fa'
+        ruta = os.path.join(CACHE_REFERENCIAS, nombre)
+        try:
+            grupos.setdefault(os.path.join(CACHE_REFERENCIAS, base), []).append((ruta, os.path.getsize(ruta)))
+        except OSError:
+            continue
+
+    total = sum(tamano for archivos in grupos.values() for _, tamano in archivos)
+    candidatas = sorted((r for r in grupos if r != conservar and os.path.exists(r)), key=os.path.getatime)
+    for ruta in candidatas:
+        if total <= limite:
+            break
+        olvidar_fasta_indexado(ruta)
+        for archivo, tamano in grupos[ruta]:
+            try:
+                os.remove(archivo)
+                total -= tamano
+            except OSError:
+                pass
+
 # Reemplazo simple de galaxy_connection.listar_historiales()
 def listar_historiales():
     """Obtiene historiales desde Galaxy y devuelve una lista formateada o error dict."""
@@ -154,6 +340,39 @@ def listar_historiales():
     except Exception as e:
         return {'error': str(e)}
 
+# ---------------------------------------------------------
+# Respuestas condicionales (ETag / Last-Modified / 304) y comprimidas
+# ---------------------------------------------------------
+MIN_BYTES_COMPRESION = 1024
+
+def ultima_actualizacion(items):
+    """Mayor 'update_time' (UTC) de una lista de objetos de Galaxy, o None."""
+    fechas = []
+    for item in items:
+        try:
+            fechas.append(datetime.fromisoformat(item['update_time']).replace(tzinfo=timezone.utc))
+        except (KeyError, TypeError, ValueError):
+            continue
+    return max(fechas, default=None)
+
+def respuesta_condicional(respuesta, ultima_modificacion=None):
+    """
+    Añade ETag (débil) y Last-Modified, responde 304 si el cliente ya tiene
+    esta versión y comprime con gzip las respuestas grandes.
+    """
+    respuesta.add_etag(weak=True)
+    if ultima_modificacion:
+        respuesta.last_modified = ultima_modificacion
+    respuesta.headers['Cache-Control'] = 'private, no-cache'
+    respuesta.vary.add('Accept-Encoding')
+    respuesta.make_conditional(request)
+
+    if (respuesta.status_code == 200 and 'gzip' in request.accept_encodings
+            and respuesta.content_length and respuesta.content_length >= MIN_BYTES_COMPRESION):
+        respuesta.set_data(gzip.compress(respuesta.get_data(), compresslevel=5))
+        respuesta.headers['Content-Encoding'] = 'gzip'
+    return respuesta
+
 # ---------------------------------------------------------
 # RUTAS DE USUARIO
 # ---------------------------------------------------------
@@ -168,15 +387,39 @@ def login():
     if request.method == 'POST':
         username = request.form['username']
         password = request.form['password']
+        ip = request.remote_addr
+
+        # Rechazo temprano y barato, antes de tocar la BD o calcular ningún hash.
+        # Solo cuentan los fallos: muchos logins correctos desde una misma IP (NAT de un aula) no bloquean
+        if limitador_ip.excedido(ip) or limitador_usuario.excedido(username):
+            flash('Demasiados intentos de inicio de sesión. Espere unos minutos e inténtelo de nuevo.', 'error')
+            return render_template('login.html'), 429
 
         # Verificar usuario en PostgreSQL
         user = Usuario.query.filter_by(username=username).first()
-        if user and check_password_hash(user.password, password):
+        try:
+            valido = user is not None and servicio_hash.verificar(user.password, password)
+        except ServidorOcupado:
+            flash('El servidor está ocupado, inténtelo de nuevo en unos segundos', 'error')
+            return render_template('login.html'), 503
+
+        if valido:
+            limitador_usuario.reiniciar(username)
+            # Actualizar hashes antiguos a los parámetros actuales aprovechando la contraseña en claro
+            try:
+                if servicio_hash.necesita_rehash(user.password):
+                    user.password = servicio_hash.generar(password)
+                    db.session.commit()
+            except ServidorOcupado:
+                pass    # Se reintentará en el próximo login
+
             session['user_id'] = user.id
             session['username'] = user.username
             flash('¡Login exitoso!', 'success')
             return redirect(url_for('dashboard'))
         else:
+            limitador_ip.registrar(ip)
+            limitador_usuario.registrar(username)
             flash('Usuario o contraseña incorrectos', 'error')
 
     return render_template('login.html')
@@ -189,6 +432,10 @@ def register():
         password = request.form.get('password')
         confirm_password = request.form.get('confirm_password')
 
+        if limitador_ip.excedido(request.remote_addr):
+            flash('Demasiados intentos. Espere unos minutos e inténtelo de nuevo.', 'error')
+            return redirect(url_for('register'))
+
         if password != confirm_password:
             flash('Las contraseñas no coinciden', 'error')
             return redirect(url_for('register'))
@@ -199,11 +446,17 @@ def register():
 
         # Verificar duplicados
         if Usuario.query.filter((Usuario.username == username) | (Usuario.email == email)).first():
+            # Cuenta como fallo: probar usuarios/emails existentes sirve para enumerarlos
+            limitador_ip.registrar(request.remote_addr)
             flash('El usuario o email ya existe', 'error')
             return redirect(url_for('register'))
 
         # Crear usuario
-        hashed = generate_password_hash(password)
+        try:
+            hashed = servicio_hash.generar(password)
+        except ServidorOcupado:
+            flash('El servidor está ocupado, inténtelo de nuevo en unos segundos', 'error')
+            return redirect(url_for('register'))
         nuevo = Usuario(username=username, email=email, password=hashed)
         db.session.add(nuevo)
         db.session.commit()
@@ -227,24 +480,21 @@ def dashboard():
     if 'user_id' not in session:
         return redirect(url_for('login'))
 
-    try:
-        # Usar la función listar_historiales que ya existe en app.py
-        historiales_galaxy = listar_historiales() 
-        
-        # Si listar_historiales devuelve un error, lo manejamos
-        if isinstance(historiales_galaxy, dict) and historiales_galaxy.get('error'):
-            flash(f"Error al obtener historiales de Galaxy: {historiales_galaxy.get('error')}", 'error')
-            historiales = []
-        else:
-            historiales = historiales_galaxy
-            
-    except Exception as e:
-        flash(f"Error al obtener historiales de Galaxy: {str(e)}", 'error')
-        historiales = []
+    # Solo la estructura de la página: las historias se cargan después desde /api/historiales,
+    # así el primer pintado no depende de la latencia de Galaxy
+    respuesta = make_response(render_template('dashboard.html', username=session.get('username')))
+    return respuesta_condicional(respuesta)
 
-    return render_template('dashboard.html',
-                           username=session.get('username'),
-                           historiales=historiales)
+@app.route('/api/historiales', methods=['GET'])
+def api_historiales():
+    if 'user_id' not in session:
+        return jsonify({'error': 'No autorizado'}), 401
+
+    historiales = listar_historiales()
+    if isinstance(historiales, dict) and historiales.get('error'):
+        return jsonify({'error': f"Error al obtener historiales de Galaxy: {historiales.get('error')}"}), 502
+
+    return respuesta_condicional(jsonify(historiales), ultima_actualizacion(historiales))
 
 # ---------------------------------------------------------
 # CREAR HISTORIA en Galaxy + guardar en BD local
@@ -424,9 +674,14 @@ def subir_archivo():
         historiales = []
 
     if request.method == 'POST':
+        # Al leer el formulario el archivo ya queda escrito en el spool (ver RequestSubidas)
         archivo = request.files.get('file')
         history_id = request.form.get('history_id')
 
+        if request.error_spool:
+            flash(f'No se pudo guardar el archivo: {request.error_spool}', 'error')
+            return redirect(url_for('subir_archivo'))
+
         if not archivo:
             flash('No se seleccionó ningún archivo', 'error')
             return redirect(url_for('subir_archivo'))
@@ -435,9 +690,8 @@ def subir_archivo():
             flash('Debe seleccionar una historia', 'error')
             return redirect(url_for('subir_archivo'))
 
-        # Guardar temporalmente
-        filepath = os.path.join(TEMP_FOLDER, archivo.filename)
-        archivo.save(filepath)
+        # Conservar la copia del spool (ruta única) y ajustar su reserva al tamaño real
+        filepath = spool.cerrar(archivo.stream)
         session['last_uploaded_filename'] = archivo.filename
 
         # Subir archivo con tipo correcto
@@ -445,9 +699,13 @@ def subir_archivo():
             dataset = gi.tools.upload_file(filepath, history_id, file_type='fastqsanger')
             dataset_id = dataset['outputs'][0]['id']
         except Exception as e:
+            spool.liberar(filepath)
             flash(f'Error al subir archivo a Galaxy: {e}', 'error')
             return redirect(url_for('subir_archivo'))
 
+        # Galaxy ya tiene el archivo: la copia local queda sujeta a TTL/LRU
+        spool.confirmar(filepath)
+
         # Guardar IDs en sesión
         session['dataset_id'] = dataset_id
         session['history_id'] = history_id
@@ -479,7 +737,7 @@ def api_datasets(history_id):
         datasets = obtener_datasets_de_historia(gi, history_id)
         # Solo retornar los campos necesarios para el frontend
         datasets_info = [{'id': d['id'], 'name': d['name'], 'file_ext': d.get('file_ext', 'desconocido')} for d in datasets]
-        return jsonify(datasets_info)
+        return respuesta_condicional(jsonify(datasets_info), ultima_actualizacion(datasets))
     except Exception as e:
         print(f"Error al obtener datasets: {e}")
         return jsonify({"error": str(e)}), 500
@@ -530,7 +788,7 @@ def api_iniciar_analisis():
                     output_ext = output.get('file_ext')
                     
                     # Filtro más flexible para el informe HTML
-                    is_html_report = (output_ext == 'html' or output_ext == 'html_file') or \
+                    is_html_report = (output_ext == 'html' or output_ext == 'html_file' or output_name == 'html_file') or \
                                      (output_name and ('webpage' in output_name.lower() or 'fastqc' in output_name.lower()))
                     
                     if is_html_report:
@@ -552,6 +810,21 @@ def api_iniciar_analisis():
                         output_type='unknown' # Marcar como desconocido
                     )
                     resultado_ids.append(resultado.id)
+
+                # 4c. Guardar y parsear una sola vez los datos crudos (fastqc_data.txt)
+                for output in r['outputs']:
+                    if output.get('name') == 'text_file' or output.get('file_ext') == 'txt':
+                        resultado_txt = guardar_resultado(
+                            analisis_id=analisis.id,
+                            galaxy_output_id=output['id'],
+                            output_type='txt'
+                        )
+                        try:
+                            importar_metricas_fastqc(gi, resultado_txt.id, output['id'])
+                        except Exception as e:
+                            db.session.rollback()
+                            print(f"Error al importar métricas de FastQC: {e}")
+                        break
                     
             # Si no se encontró ningún output, marcamos el análisis como advertencia
             if not resultado_ids:
@@ -577,6 +850,64 @@ def api_iniciar_analisis():
         print(f"Error al ejecutar {tool}: {e}")
         return jsonify({'error': f'Error al ejecutar {tool}: {str(e)}'}), 500
 
+# ---------------------------------------------------------
+# API de métricas FastQC (consultas entre muestras)
+# ---------------------------------------------------------
+@app.route('/api/metricas_fastqc', methods=['GET'])
+def api_metricas_fastqc():
+    if 'user_id' not in session:
+        return jsonify({'error': 'No autorizado'}), 401
+
+    try:
+        desde = request.args.get('desde')
+        hasta = request.args.get('hasta')
+        muestras = buscar_metricas_fastqc(
+            user_id=session['user_id'],
+            modulo=request.args.get('modulo'),
+            estado=request.args.get('estado'),
+            desde=datetime.fromisoformat(desde) if desde else None,
+            hasta=datetime.fromisoformat(hasta) if hasta else None
+        )
+        return jsonify(muestras)
+    except ValueError as e:
+        return jsonify({'error': f'Fecha inválida: {e}'}), 400
+
+# ---------------------------------------------------------
+# INFORME QC MULTI-MUESTRA (a partir de las métricas guardadas)
+# ---------------------------------------------------------
+MAX_MUESTRAS_RESUMEN = 500
+
+@app.route('/resultados/resumen')
+def resumen_qc():
+    if 'user_id' not in session:
+        return redirect(url_for('login'))
+
+    # La página solo contiene la estructura; los datos se piden a /api/resumen_qc
+    return render_template('resumen_qc.html', username=session.get('username'))
+
+@app.route('/api/resumen_qc', methods=['GET'])
+def api_resumen_qc():
+    if 'user_id' not in session:
+        return jsonify({'error': 'No autorizado'}), 401
+
+    try:
+        desde = request.args.get('desde')
+        hasta = request.args.get('hasta')
+        hasta = datetime.fromisoformat(hasta) if hasta else None
+        if hasta and len(request.args['hasta']) == 10:
+            hasta += timedelta(days=1)   # 'hasta' sin hora incluye el día completo
+        muestras = buscar_metricas_fastqc(
+            user_id=session['user_id'],
+            analisis_id=request.args.get('analisis_id', type=int),
+            desde=datetime.fromisoformat(desde) if desde else None,
+            hasta=hasta
+        )
+    except ValueError as e:
+        return jsonify({'error': f'Fecha inválida: {e}'}), 400
+
+    resultado_ids = [m['resultado_id'] for m in muestras[:MAX_MUESTRAS_RESUMEN]]
+    return jsonify(resumen_multimuestra(resultado_ids))
+
 # ---------------------------------------------------------
 # RUTA PARA VISUALIZAR EL RESULTADO DE FASTQC
 # ---------------------------------------------------------
@@ -594,7 +925,7 @@ def ver_resultado(resultado_id):
             
         # 2. Descargar el contenido del dataset (el informe HTML)
         galaxy_output_id = resultado.galaxy_output_id
-        dataset_content = gi.datasets.download_dataset(galaxy_output_id, stream=False)
+        dataset_content = gi.datasets.download_dataset(galaxy_output_id)
         
         # 3. Servir el contenido como HTML
         return Response(dataset_content, mimetype='text/html')
@@ -638,27 +969,180 @@ def ejecutar_bowtie():
         inputs = {
             'input_1': {'id': dataset_id, 'src': 'hda'},
             'reference_genome': 'hg19',
-            'analysis_type': 'default'
+            'analysis_type': 'default',
+            'sam_opt': True   # SAM para poder resumir el alineamiento en streaming
         }
-        gi.tools.run_tool(history_id, tool_bowtie, inputs)
+        ejecucion = gi.tools.run_tool(history_id, tool_bowtie, inputs)
         flash('✅ Bowtie2 ejecutado correctamente en Galaxy', 'success')
-        guardar_en_historial(session['user_id'], 'Bowtie2', dataset_id, 'completado')
+        analisis = guardar_en_historial(session['user_id'], 'Bowtie2', dataset_id, 'completado')
+
+        # Guardar el alineamiento como resultado y resumirlo en segundo plano cuando termine
+        for output in ejecucion.get('outputs', []):
+            resultado = guardar_resultado(analisis.id, output['id'], 'sam')
+            programar_resumen_alineamiento(resultado.id, output['id'])
     except Exception as e:
         flash(f'⚠️ Error al ejecutar Bowtie2: {e}', 'error')
         guardar_en_historial(session['user_id'], 'Bowtie2', dataset_id or 'desconocido', 'error')
 
     return redirect(url_for('dashboard'))
 
+# ---------------------------------------------------------
+# RESUMEN DEL ALINEAMIENTO (SAM leído en streaming desde Galaxy, en segundo plano)
+# ---------------------------------------------------------
+ESPERA_MAX_ALINEAMIENTO = 6 * 3600
+LATIDO_RESUMEN = 60                 # el hilo que resume actualiza su fila cada minuto
+RESUMEN_ABANDONADO = 10 * 60        # sin latido en este tiempo, el worker murió y otro puede retomarlo
+REINTENTO_RESUMEN = 60              # un resumen fallido se reintenta pasado este tiempo
+
+def reclamar_resumen_alineamiento(resultado_id: int) -> bool:
+    """
+    Reserva en la BD el cálculo del resumen: la fila 'procesando' (resultado_id único) hace de
+    lock entre workers. True si este proceso se queda con el trabajo.
+    """
+    ahora = datetime.utcnow()
+    if not ResumenAlineamiento.query.filter_by(resultado_id=resultado_id).first():
+        db.session.add(ResumenAlineamiento(resultado_id=resultado_id, estado='procesando', actualizado_en=ahora))
+        try:
+            db.session.commit()
+            return True
+        except IntegrityError:
+            db.session.rollback()
+
+    # Ya existe: solo se retoma si quedó abandonada o falló hace tiempo (UPDATE condicional, atómico)
+    retomadas = ResumenAlineamiento.query.filter(
+        ResumenAlineamiento.resultado_id == resultado_id,
+        or_(and_(ResumenAlineamiento.estado == 'procesando',
+                 ResumenAlineamiento.actualizado_en < ahora - timedelta(seconds=RESUMEN_ABANDONADO)),
+            and_(ResumenAlineamiento.estado == 'error',
+                 ResumenAlineamiento.actualizado_en < ahora - timedelta(seconds=REINTENTO_RESUMEN)))
+    ).update({'estado': 'procesando', 'error': None, 'actualizado_en': ahora}, synchronize_session=False)
+    db.session.commit()
+    return retomadas == 1
+
+def resumir_alineamiento(resultado_id: int, galaxy_output_id: str):
+    """Espera a que el SAM esté listo en Galaxy, lo resume en streaming y completa la fila reservada."""
+    with app.app_context():
+        ultimo_latido = time.monotonic()
+
+        def latir():
+            nonlocal ultimo_latido
+            if time.monotonic() - ultimo_latido >= LATIDO_RESUMEN:
+                ultimo_latido = time.monotonic()
+                ResumenAlineamiento.query.filter_by(resultado_id=resultado_id) \
+                    .update({'actualizado_en': datetime.utcnow()}, synchronize_session=False)
+                db.session.commit()
+
+        def con_latido(bloques):
+            for bloque in bloques:
+                latir()
+                yield bloque
+
+        try:
+            limite = time.monotonic() + ESPERA_MAX_ALINEAMIENTO
+            dataset = gi.datasets.show_dataset(galaxy_output_id)
+            while dataset.get('state') != 'ok':
+                if dataset.get('state') in ('error', 'discarded', 'failed_metadata') or time.monotonic() > limite:
+                    raise RuntimeError(f"El alineamiento no está disponible (estado: {dataset.get('state')})")
+                time.sleep(10)
+                latir()
+                dataset = gi.datasets.show_dataset(galaxy_output_id)
+            if dataset.get('file_ext') != 'sam':
+                raise RuntimeError(f"El alineamiento está en formato {dataset.get('file_ext')}, se requiere SAM")
+
+            resumen = resumir_sam(con_latido(descargar_dataset_en_bloques(gi, galaxy_output_id)))
+            resumen.pop('tasa_pareadas_correctamente')
+            campos = dict(resumen, estado='completado', error=None, actualizado_en=datetime.utcnow())
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error al resumir alineamiento {resultado_id}: {e}")
+            campos = {'estado': 'error', 'error': str(e), 'actualizado_en': datetime.utcnow()}
+
+        ResumenAlineamiento.query.filter_by(resultado_id=resultado_id).update(campos, synchronize_session=False)
+        db.session.commit()
+
+def programar_resumen_alineamiento(resultado_id: int, galaxy_output_id: str):
+    """Lanza el resumen en un hilo de fondo si este worker consigue reservarlo en la BD."""
+    if reclamar_resumen_alineamiento(resultado_id):
+        threading.Thread(target=resumir_alineamiento, args=(resultado_id, galaxy_output_id),
+                         name=f'resumen-sam-{resultado_id}', daemon=True).start()
+
+@app.route('/resultados/alineamiento/<int:resultado_id>')
+def resumen_alineamiento(resultado_id):
+    if 'user_id' not in session:
+        return redirect(url_for('login'))
+
+    # La página solo contiene la estructura; los datos se piden a /api/resumen_alineamiento
+    return render_template('resumen_alineamiento.html', username=session.get('username'), resultado_id=resultado_id)
+
+@app.route('/api/resumen_alineamiento/<int:resultado_id>', methods=['GET'])
+def api_resumen_alineamiento(resultado_id):
+    if 'user_id' not in session:
+        return jsonify({'error': 'No autorizado'}), 401
+
+    resultado = db.session.query(Resultado).join(Analisis, Analisis.id == Resultado.analisis_id) \
+        .filter(Resultado.id == resultado_id, Analisis.user_id == session['user_id']).first()
+    if not resultado or resultado.output_type != 'sam':
+        return jsonify({'error': 'Alineamiento no encontrado'}), 404
+
+    # El resumen se calcula una sola vez (en segundo plano) y queda guardado junto al análisis
+    guardado = ResumenAlineamiento.query.filter_by(resultado_id=resultado_id).first()
+    if guardado and guardado.estado == 'completado':
+        return jsonify(guardado.to_dict())
+    if guardado and guardado.estado == 'error' and \
+            datetime.utcnow() - guardado.actualizado_en < timedelta(seconds=REINTENTO_RESUMEN):
+        return jsonify({'error': guardado.error}), 500
+
+    # Sin resumen, abandonado o fallido hace tiempo: se reprograma (solo un worker lo consigue)
+    programar_resumen_alineamiento(resultado_id, resultado.galaxy_output_id)
+    return jsonify({'estado': 'procesando'}), 202
+
+# ---------------------------------------------------------
+# API DE GENOMAS DE REFERENCIA (índice .fai + acceso por mmap)
+# ---------------------------------------------------------
+MAX_BASES_REGION = 1_000_000
+
+@app.route('/api/referencia/<dataset_id>', methods=['GET'])
+def api_referencia(dataset_id):
+    if 'user_id' not in session:
+        return jsonify({'error': 'No autorizado'}), 401
+
+    try:
+        return jsonify(obtener_referencia_local(dataset_id).resumen())
+    except IndiceFastaError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        print(f"Error al indexar referencia: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/referencia/<dataset_id>/region', methods=['GET'])
+def api_referencia_region(dataset_id):
+    if 'user_id' not in session:
+        return jsonify({'error': 'No autorizado'}), 401
+
+    try:
+        fasta = obtener_referencia_local(dataset_id)
+        nombre, inicio, fin = parsear_region(request.args.get('region', ''), fasta.contigs)
+        if nombre not in fasta.contigs:
+            return jsonify({'error': f"Contig '{nombre}' no encontrado"}), 404
+
+        inicio = inicio or 1
+        fin = fin or fasta.contigs[nombre]['longitud']
+        if fin - inicio + 1 > MAX_BASES_REGION:
+            return jsonify({'error': f'La región supera el máximo de {MAX_BASES_REGION} bases'}), 400
+
+        secuencia = fasta.region(nombre, inicio, fin)
+        return jsonify({'contig': nombre, 'inicio': inicio, 'fin': inicio + len(secuencia) - 1, 'secuencia': secuencia})
+    except (ValueError, IndiceFastaError) as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        print(f"Error al leer región de referencia: {e}")
+        return jsonify({'error': str(e)}), 500
+
 # ---------------------------------------------------------
 # Ejecutar servidor
 # ---------------------------------------------------------
 if __name__ == '__main__':
-#<<<<<<< HEAD
-    app.run(host="0.0.0.0", port=5000, debug=True)
-
-#=======
     # Crea las tablas si no existen
     with app.app_context():
         db.create_all()
-    app.run(debug=True)
-#>>>>>>> erick/main
+    app.run(host="0.0.0.0", port=5000, debug=True)
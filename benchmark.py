@@ -0,0 +1,176 @@
+"""
+Benchmark de latencia y throughput de las rutas principales de la app.
+
+Por defecto levanta en el mismo proceso el Galaxy falso (fake_galaxy.py) y la app,
+así no se toca usegalaxy.org. Con --url se mide una instancia ya en marcha.
+
+Uso:
+    python benchmark.py --base-datos benchmark.db --concurrencia 1 4 16 --peticiones 200
+    python benchmark.py --url http://127.0.0.1:5000 --usuario bench --password bench123
+
+Los resultados se escriben en JSON (--salida) para compararlos entre commits.
+"""
+import argparse
+import importlib
+import json
+import logging
+import math
+import os
+import subprocess
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import requests
+
+RUTAS = ['/dashboard', '/api/datasets', '/api/iniciar_analisis', '/ver_resultado']
+
+def percentil(valores_ordenados, p):
+    """Percentil por rango más cercano sobre una lista ya ordenada."""
+    if not valores_ordenados:
+        return None
+    indice = math.ceil(p / 100.0 * len(valores_ordenados)) - 1
+    return valores_ordenados[max(0, min(len(valores_ordenados) - 1, indice))]
+
+def resumir_latencias(latencias_ms, duracion_s, estados=None, error_desde=300):
+    """Resumen estándar (p50/p95/p99, media, throughput) de una lista de latencias en ms."""
+    ordenadas = sorted(latencias_ms)
+    estados = estados or Counter()
+    return {
+        'peticiones': len(ordenadas),
+        # Las rutas del benchmark responden 200 en condiciones normales; una redirección indica error
+        'errores': sum(n for codigo, n in estados.items() if codigo is None or codigo >= error_desde),
+        'estados': {str(codigo): n for codigo, n in sorted(estados.items(), key=lambda e: str(e[0]))},
+        'p50_ms': round(percentil(ordenadas, 50), 2) if ordenadas else None,
+        'p95_ms': round(percentil(ordenadas, 95), 2) if ordenadas else None,
+        'p99_ms': round(percentil(ordenadas, 99), 2) if ordenadas else None,
+        'media_ms': round(sum(ordenadas) / len(ordenadas), 2) if ordenadas else None,
+        'max_ms': round(ordenadas[-1], 2) if ordenadas else None,
+        'throughput_rps': round(len(ordenadas) / duracion_s, 2) if duracion_s > 0 else None
+    }
+
+def commit_actual():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def iniciar_entorno_local(latencia_ms, duracion_jobs, tasa_error, base_datos=None):
+    """Arranca el Galaxy falso y la app (servidor werkzeug con hilos). Devuelve (url_app, galaxy)."""
+    from fake_galaxy import GalaxyFalso
+    from werkzeug.serving import make_server
+
+    galaxy = GalaxyFalso(latencia_ms=latencia_ms, duracion_jobs=duracion_jobs, tasa_error=tasa_error)
+    os.environ['GALAXY_URL'] = galaxy.iniciar()
+    os.environ['GALAXY_API_KEY'] = 'falsa'
+    os.environ.setdefault('SECRET_KEY', 'benchmark')
+    # Todas las sesiones del benchmark inician sesión desde 127.0.0.1
+    os.environ.setdefault('LOGIN_MAX_INTENTOS_IP', '1000000')
+
+    if base_datos:
+        # Perfil SQLite (WAL) de db_perfiles; debe fijarse antes de importar config
+        os.environ['DB_PERFIL'] = 'sqlite'
+        os.environ['DATABASE_SQLITE_PATH'] = os.path.abspath(base_datos)
+    modulo_app = importlib.import_module('app')
+    with modulo_app.app.app_context():
+        modulo_app.db.create_all()
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    servidor = make_server('127.0.0.1', 0, modulo_app.app, threaded=True)
+    threading.Thread(target=servidor.serve_forever, name='app-benchmark', daemon=True).start()
+    return f'http://127.0.0.1:{servidor.server_port}', galaxy
+
+def iniciar_sesion(url, usuario, password):
+    """Sesión HTTP autenticada (registra el usuario si todavía no existe)."""
+    sesion = requests.Session()
+    sesion.post(f'{url}/register', data={'username': usuario, 'email': f'{usuario}@benchmark.local',
+                                         'password': password, 'confirm_password': password},
+                allow_redirects=False)
+    sesion.post(f'{url}/login', data={'username': usuario, 'password': password}, allow_redirects=False)
+    return sesion
+
+def preparar_escenarios(url, sesion):
+    """Obtiene una historia, sus datasets y un resultado para construir las peticiones de cada ruta."""
+    historiales = sesion.get(f'{url}/api/historiales').json()
+    history_id = historiales[0]['id']
+    datasets = sesion.get(f'{url}/api/datasets/{history_id}').json()
+    analisis = {'tool': 'fastqc', 'history_id': history_id,
+                'datasetID_R1': datasets[0]['id'], 'datasetID_R2': None}
+    resultado_ids = sesion.post(f'{url}/api/iniciar_analisis', json=analisis).json().get('resultado_ids') or [0]
+
+    return {
+        '/dashboard': lambda s: s.get(f'{url}/dashboard', allow_redirects=False),
+        '/api/datasets': lambda s: s.get(f'{url}/api/datasets/{history_id}', allow_redirects=False),
+        '/api/iniciar_analisis': lambda s: s.post(f'{url}/api/iniciar_analisis', json=analisis, allow_redirects=False),
+        '/ver_resultado': lambda s: s.get(f'{url}/ver_resultado/{resultado_ids[0]}', allow_redirects=False)
+    }
+
+def medir(escenario, concurrencia, peticiones, crear_sesion):
+    """Lanza `peticiones` llamadas con `concurrencia` hilos (una sesión por hilo) y resume latencias."""
+    local = threading.local()
+    latencias, estados = [], Counter()
+    bloqueo = threading.Lock()
+
+    def una_peticion(_):
+        if not hasattr(local, 'sesion'):
+            local.sesion = crear_sesion()
+        inicio = time.perf_counter()
+        try:
+            codigo = escenario(local.sesion).status_code
+        except requests.RequestException:
+            codigo = None
+        transcurrido = (time.perf_counter() - inicio) * 1000.0
+        with bloqueo:
+            latencias.append(transcurrido)
+            estados[codigo] += 1
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrencia) as ejecutor:
+        list(ejecutor.map(una_peticion, range(peticiones)))
+    return resumir_latencias(latencias, time.perf_counter() - inicio, estados)
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de latencia/throughput de la app Galaxy')
+    parser.add_argument('--url', help='URL de una instancia ya en marcha (si se omite, se levanta una local)')
+    parser.add_argument('--usuario', default='bench')
+    parser.add_argument('--password', default='bench123')
+    parser.add_argument('--rutas', nargs='+', default=RUTAS, choices=RUTAS)
+    parser.add_argument('--concurrencia', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--peticiones', type=int, default=100, help='peticiones por ruta y nivel de concurrencia')
+    parser.add_argument('--base-datos', help='archivo SQLite para el modo local (p. ej. benchmark.db); usa el perfil DB_PERFIL=sqlite')
+    parser.add_argument('--latencia-ms', type=float, nargs=2, default=(20, 80), metavar=('MIN', 'MAX'),
+                        help='latencia del Galaxy falso')
+    parser.add_argument('--duracion-jobs', type=float, default=0.0)
+    parser.add_argument('--tasa-error', type=float, default=0.0)
+    parser.add_argument('--salida', default='benchmark_resultados.json')
+    args = parser.parse_args()
+
+    url = args.url
+    if not url:
+        url, _ = iniciar_entorno_local(tuple(args.latencia_ms), args.duracion_jobs, args.tasa_error, args.base_datos)
+    crear_sesion = lambda: iniciar_sesion(url, args.usuario, args.password)
+    escenarios = preparar_escenarios(url, crear_sesion())
+
+    resultados = []
+    for ruta in args.rutas:
+        for concurrencia in args.concurrencia:
+            resumen = medir(escenarios[ruta], concurrencia, args.peticiones, crear_sesion)
+            resultados.append(dict(ruta=ruta, concurrencia=concurrencia, **resumen))
+            print(f"{ruta:<24} c={concurrencia:<3} p50={resumen['p50_ms']}ms p95={resumen['p95_ms']}ms "
+                  f"p99={resumen['p99_ms']}ms {resumen['throughput_rps']} req/s errores={resumen['errores']}")
+
+    with open(args.salida, 'w') as f:
+        json.dump({
+            'commit': commit_actual(),
+            'fecha': datetime.utcnow().isoformat(),
+            'url': args.url or 'local',
+            'parametros': {k: v for k, v in vars(args).items() if k not in ('password', 'salida')},
+            'resultados': resultados
+        }, f, indent=2)
+    print(f'Resultados guardados en {args.salida}')
+
+if __name__ == '__main__':
+    main()
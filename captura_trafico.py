@@ -0,0 +1,130 @@
+import hashlib
+import json
+import queue
+import random
+import threading
+import time
+
+from flask import g, request, session
+
+# Claves cuyo valor nunca se escribe en el log (formularios, JSON y query string)
+CAMPOS_SENSIBLES = {'password', 'confirm_password', 'contrasena', 'api_key', 'key', 'token',
+                    'secret', 'csrf_token', 'email', 'username'}
+REDACTADO = '<redactado>'
+# Identificadores no secretos cuyo valor sí se guarda en el JSON, para que el replay sea realista
+CAMPOS_IDENTIFICADORES = {'tool', 'history_id', 'datasetid_r1', 'datasetid_r2', 'herramienta', 'estado'}
+
+def forma_de(valor, profundidad=0):
+    """Describe la forma de un valor JSON (tipos y tamaños) sin su contenido, salvo los identificadores."""
+    if isinstance(valor, dict):
+        if profundidad > 3:
+            return 'dict'
+        forma = {}
+        for k, v in valor.items():
+            if k.lower() in CAMPOS_IDENTIFICADORES and isinstance(v, (str, int)):
+                forma[k] = {'literal': v}
+            else:
+                forma[k] = forma_de(v, profundidad + 1)
+        return forma
+    if isinstance(valor, list):
+        return {'lista': len(valor), 'elemento': forma_de(valor[0], profundidad + 1) if valor else None}
+    if valor is None:
+        return 'null'
+    return type(valor).__name__
+
+def cubeta_usuario(user_id, cubetas):
+    """Agrupa usuarios en `cubetas` anónimas y estables (no se guarda el id real)."""
+    if user_id is None:
+        return None
+    return int(hashlib.sha256(str(user_id).encode()).hexdigest(), 16) % cubetas
+
+class CapturaTrafico:
+    """
+    Middleware opcional que muestrea peticiones reales y las escribe en un JSONL
+    (ruta, parámetros, forma del cuerpo, tiempos y cubeta de usuario) con
+    credenciales y archivos redactados. La escritura se hace en un hilo aparte.
+    Las peticiones que terminan en una excepción no capturada (sin after_request)
+    se registran en teardown_request con estado 500.
+    """
+
+    def __init__(self, ruta_archivo='requests.jsonl', tasa_muestreo=0.1, cubetas=16):
+        self.ruta_archivo = ruta_archivo
+        self.tasa_muestreo = tasa_muestreo
+        self.cubetas = cubetas
+        self._cola = queue.Queue(maxsize=10000)
+        self._hilo = None
+
+    def registrar(self, app):
+        app.before_request(self._antes)
+        app.after_request(self._despues)
+        app.teardown_request(self._al_terminar)
+        self._hilo = threading.Thread(target=self._escribir, name='captura-trafico', daemon=True)
+        self._hilo.start()
+
+    def _antes(self):
+        g.capturar_peticion = random.random() < self.tasa_muestreo
+        g.inicio_peticion = time.perf_counter()
+
+    def _encolar(self, estado, bytes_respuesta):
+        g.capturar_peticion = False     # Una sola entrada por petición
+        try:
+            self._cola.put_nowait(self._entrada(estado, bytes_respuesta))
+        except queue.Full:
+            pass    # Nunca frenar la petición por el log
+
+    def _despues(self, respuesta):
+        if getattr(g, 'capturar_peticion', False):
+            self._encolar(respuesta.status_code, respuesta.calculate_content_length())
+        return respuesta
+
+    def _al_terminar(self, error):
+        # after_request no se ejecuta si la vista lanzó una excepción sin manejar
+        if error is not None and getattr(g, 'capturar_peticion', False):
+            self._encolar(500, None)
+
+    def _entrada(self, estado, bytes_respuesta):
+        query = {k: REDACTADO if k.lower() in CAMPOS_SENSIBLES else v for k, v in request.args.items()}
+        formulario = {k: REDACTADO if k.lower() in CAMPOS_SENSIBLES else 'str' for k in request.form.keys()}
+        archivos = {k: {'tamano': _tamano(f), 'tipo': f.mimetype} for k, f in request.files.items()}
+        cuerpo_json = request.get_json(silent=True) if request.is_json else None
+
+        return {
+            'ts': time.time(),
+            'metodo': request.method,
+            'ruta': request.url_rule.rule if request.url_rule else None,
+            'path': request.path,
+            'args_ruta': request.view_args or {},
+            'query': query,
+            'formulario': formulario or None,
+            'json': forma_de(cuerpo_json) if cuerpo_json is not None else None,
+            'archivos': archivos or None,
+            'bytes_peticion': request.content_length or 0,
+            'estado': estado,
+            'bytes_respuesta': bytes_respuesta,
+            'duracion_ms': round((time.perf_counter() - g.inicio_peticion) * 1000.0, 2),
+            'cubeta_usuario': cubeta_usuario(session.get('user_id'), self.cubetas)
+        }
+
+    def _escribir(self):
+        while True:
+            entradas = [self._cola.get()]
+            # Agrupar lo pendiente en una sola escritura
+            while not self._cola.empty() and len(entradas) < 500:
+                entradas.append(self._cola.get_nowait())
+            try:
+                with open(self.ruta_archivo, 'a') as f:
+                    f.write(''.join(json.dumps(e, ensure_ascii=False) + '\n' for e in entradas))
+            except OSError as e:
+                print(f"Error al escribir la captura de tráfico: {e}")
+
+def _tamano(archivo):
+    """Tamaño de un FileStorage sin leerlo en memoria."""
+    flujo = archivo.stream
+    try:
+        posicion = flujo.tell()
+        flujo.seek(0, 2)
+        tamano = flujo.tell()
+        flujo.seek(posicion)
+        return tamano
+    except (AttributeError, OSError):
+        return archivo.content_length or None
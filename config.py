@@ -1,6 +1,8 @@
 import os
 from dotenv import load_dotenv
 
+from db_perfiles import uri_postgres, uri_sqlite, opciones_motor
+
 # Cargar .env explícitamente desde la ruta del proyecto
 env_path = os.path.join(os.path.dirname(__file__), ".env")
 load_dotenv(env_path)
@@ -8,15 +10,83 @@ load_dotenv(env_path)
 class Config:
     SECRET_KEY = os.getenv("SECRET_KEY")
 
-    SQLALCHEMY_DATABASE_URI = (
-        f"postgresql://{os.getenv('DATABASE_USER')}:"
-        f"{os.getenv('DATABASE_PASSWORD')}"
-        f"@{os.getenv('DATABASE_HOST')}:"
-        f"{os.getenv('DATABASE_PORT')}/"
-        f"{os.getenv('DATABASE_NAME')}"
+    # Perfil de base de datos: 'postgres' (por defecto) o 'sqlite' (instalación de un solo nodo)
+    DB_PERFIL = os.getenv("DB_PERFIL", "postgres")
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+    DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+    DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+    DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+    DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "30000"))
+    DATABASE_REPLICA_HOST = os.getenv("DATABASE_REPLICA_HOST")      # réplica de lectura (opcional)
+    DATABASE_SQLITE_PATH = os.getenv("DATABASE_SQLITE_PATH",
+                                     os.path.join(os.path.dirname(os.path.abspath(__file__)), "galaxy_usuarios.db"))
+    SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+    SQLITE_MMAP_MB = int(os.getenv("SQLITE_MMAP_MB", "256"))
+
+    if DB_PERFIL == "sqlite":
+        SQLALCHEMY_DATABASE_URI = uri_sqlite(os.path.abspath(DATABASE_SQLITE_PATH))
+    else:
+        SQLALCHEMY_DATABASE_URI = uri_postgres(
+            os.getenv('DATABASE_USER'),
+            os.getenv('DATABASE_PASSWORD'),
+            os.getenv('DATABASE_HOST'),
+            os.getenv('DATABASE_PORT'),
+            os.getenv('DATABASE_NAME')
+        )
+
+    SQLALCHEMY_ENGINE_OPTIONS = opciones_motor(
+        DB_PERFIL,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_timeout=DB_POOL_TIMEOUT,
+        statement_timeout_ms=DB_STATEMENT_TIMEOUT_MS,
+        busy_timeout_ms=SQLITE_BUSY_TIMEOUT_MS
     )
 
+    # Las lecturas de historial/resultados van a la réplica si está configurada (solo Postgres)
+    SQLALCHEMY_BINDS = {}
+    if DB_PERFIL == "postgres" and DATABASE_REPLICA_HOST:
+        SQLALCHEMY_BINDS['lectura'] = dict(
+            SQLALCHEMY_ENGINE_OPTIONS,
+            url=uri_postgres(
+                os.getenv('DATABASE_USER'),
+                os.getenv('DATABASE_PASSWORD'),
+                DATABASE_REPLICA_HOST,
+                os.getenv('DATABASE_REPLICA_PORT', os.getenv('DATABASE_PORT')),
+                os.getenv('DATABASE_NAME')
+            )
+        )
+
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
     GALAXY_URL = os.getenv("GALAXY_URL")
     GALAXY_API_KEY = os.getenv("GALAXY_API_KEY")
+
+    # Spool de subidas temporales (carpeta temp/)
+    SPOOL_CUOTA_MB = int(os.getenv("SPOOL_CUOTA_MB", "2048"))
+    # Un cuerpo mayor que la cuota entera nunca cabría: se rechaza (413) antes de leerlo
+    MAX_CONTENT_LENGTH = SPOOL_CUOTA_MB * 1024 * 1024
+    SPOOL_TTL_SEGUNDOS = int(os.getenv("SPOOL_TTL_SEGUNDOS", "3600"))
+    SPOOL_ESPERA_SEGUNDOS = int(os.getenv("SPOOL_ESPERA_SEGUNDOS", "30"))
+    SPOOL_BARRIDO_SEGUNDOS = int(os.getenv("SPOOL_BARRIDO_SEGUNDOS", "300"))
+    SPOOL_TMPFS_DIR = os.getenv("SPOOL_TMPFS_DIR")            # p. ej. /dev/shm/galaxy_spool
+    SPOOL_TMPFS_UMBRAL_MB = int(os.getenv("SPOOL_TMPFS_UMBRAL_MB", "16"))
+
+    # Copias locales de genomas de referencia (cache/referencias)
+    CACHE_REFERENCIAS_MAX_MB = int(os.getenv("CACHE_REFERENCIAS_MAX_MB", "10240"))
+
+    # Captura de tráfico real (opcional) para reproducirlo con replay_trafico.py
+    CAPTURA_TRAFICO = os.getenv("CAPTURA_TRAFICO", "0") == "1"
+    CAPTURA_TRAFICO_ARCHIVO = os.getenv("CAPTURA_TRAFICO_ARCHIVO", "requests.jsonl")
+    CAPTURA_TRAFICO_MUESTREO = float(os.getenv("CAPTURA_TRAFICO_MUESTREO", "0.1"))
+
+    # Hashing de contraseñas fuera de los workers web y límites de intentos de login
+    HASH_PROCESOS = int(os.getenv("HASH_PROCESOS", "2"))
+    HASH_MAX_PENDIENTES = int(os.getenv("HASH_MAX_PENDIENTES", "8"))
+    HASH_TIMEOUT_SEGUNDOS = float(os.getenv("HASH_TIMEOUT_SEGUNDOS", "10"))
+    HASH_METODO = os.getenv("HASH_METODO", "scrypt")
+    LOGIN_MAX_INTENTOS_IP = int(os.getenv("LOGIN_MAX_INTENTOS_IP", "30"))          # fallos por minuto
+    # Número de proxies inversos delante de la app (0 = conexión directa); activa ProxyFix
+    PROXIES_CONFIABLES = int(os.getenv("PROXIES_CONFIABLES", "0"))
+    LOGIN_MAX_FALLOS_USUARIO = int(os.getenv("LOGIN_MAX_FALLOS_USUARIO", "5"))     # cada 15 minutos
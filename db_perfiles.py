@@ -0,0 +1,63 @@
+import sqlite3
+from contextlib import contextmanager
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+PERFILES = ('postgres', 'sqlite')
+
+def uri_postgres(usuario, password, host, puerto, nombre):
+    return f"postgresql://{usuario}:{password}@{host}:{puerto}/{nombre}"
+
+def uri_sqlite(ruta):
+    return f"sqlite:///{ruta}"
+
+def opciones_motor(perfil, pool_size=5, max_overflow=10, pool_recycle=1800, pool_timeout=30,
+                   statement_timeout_ms=30000, busy_timeout_ms=5000):
+    """Opciones de create_engine (SQLALCHEMY_ENGINE_OPTIONS) para cada perfil."""
+    if perfil not in PERFILES:
+        raise ValueError(f"Perfil de base de datos desconocido: {perfil} (opciones: {', '.join(PERFILES)})")
+
+    if perfil == 'sqlite':
+        return {
+            'connect_args': {
+                'timeout': busy_timeout_ms / 1000.0,    # espera del driver si la BD está bloqueada
+                'check_same_thread': False
+            }
+        }
+
+    return {
+        'pool_size': pool_size,
+        'max_overflow': max_overflow,
+        'pool_recycle': pool_recycle,
+        'pool_timeout': pool_timeout,
+        'pool_pre_ping': True,
+        'connect_args': {'options': f'-c statement_timeout={statement_timeout_ms}'}
+    }
+
+def activar_pragmas_sqlite(mmap_mb=256, busy_timeout_ms=5000):
+    """
+    Configura cada conexión SQLite nueva: WAL (los lectores no bloquean al escritor),
+    synchronous=NORMAL, lecturas por mmap y busy_timeout.
+    """
+    @event.listens_for(Engine, 'connect')
+    def _pragmas(conexion_dbapi, _registro):
+        if not isinstance(conexion_dbapi, sqlite3.Connection):
+            return
+        cursor = conexion_dbapi.cursor()
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA synchronous=NORMAL')
+        cursor.execute(f'PRAGMA mmap_size={int(mmap_mb) * 1024 * 1024}')
+        cursor.execute(f'PRAGMA busy_timeout={int(busy_timeout_ms)}')
+        cursor.close()
+
+@contextmanager
+def sesion_lectura(db):
+    """Sesión para consultas de solo lectura: usa la réplica ('lectura') si está configurada."""
+    motor = db.engines.get('lectura')
+    if motor is None:
+        yield db.session
+        return
+    with Session(motor) as sesion:
+        yield sesion
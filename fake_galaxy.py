@@ -0,0 +1,316 @@
+"""
+Servidor Galaxy falso (en proceso) para pruebas de carga y regresión de rendimiento.
+
+Implementa solo los endpoints de la API que usa la app a través de bioblend:
+historias, contenidos, tools (run_tool y subida legacy), jobs, datasets y descarga.
+Latencia, duración de jobs y tasas de error son configurables.
+
+Uso:
+    python fake_galaxy.py --puerto 8081 --latencia-ms 20 80 --duracion-jobs 0
+    GALAXY_URL=http://127.0.0.1:8081 GALAXY_API_KEY=falsa python app.py
+"""
+import argparse
+import itertools
+import json
+import random
+import re
+import threading
+import time
+from datetime import datetime
+from email.parser import BytesParser
+from email.policy import default as politica_email
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+# Versión < 22.01 para que bioblend use la subida multipart clásica (sin tus)
+VERSION_GALAXY = {'version_major': '21.09', 'version_minor': '0'}
+
+def _ahora_iso():
+    return datetime.utcnow().isoformat()
+
+def generar_fastq(lecturas=200, longitud=50, semilla=0):
+    aleatorio = random.Random(semilla)
+    lineas = []
+    for i in range(lecturas):
+        lineas.append(f'@lectura_{i}')
+        lineas.append(''.join(aleatorio.choice('ACGT') for _ in range(longitud)))
+        lineas.append('+')
+        lineas.append(''.join(chr(33 + aleatorio.randint(20, 40)) for _ in range(longitud)))
+    return ('\n'.join(lineas) + '\n').encode()
+
+def generar_fasta(contigs=3, longitud=5000, ancho=60, semilla=0):
+    aleatorio = random.Random(semilla)
+    partes = []
+    for c in range(contigs):
+        secuencia = ''.join(aleatorio.choice('ACGT') for _ in range(longitud))
+        partes.append(f'>contig_{c}\n' + ''.join(secuencia[i:i + ancho] + '\n' for i in range(0, longitud, ancho)))
+    return ''.join(partes).encode()
+
+def generar_fastqc_data(nombre, lecturas=200, longitud=50, semilla=0):
+    aleatorio = random.Random(semilla)
+    estado = lambda: aleatorio.choice(['pass', 'pass', 'warn', 'fail'])
+    lineas = ['##FastQC\t0.11.9',
+              '>>Basic Statistics\tpass', '#Measure\tValue', f'Filename\t{nombre}',
+              'Encoding\tSanger / Illumina 1.9', f'Total Sequences\t{lecturas}',
+              'Sequences flagged as poor quality\t0', f'Sequence length\t{longitud}', '%GC\t50', '>>END_MODULE',
+              f'>>Per base sequence quality\t{estado()}',
+              '#Base\tMean\tMedian\tLower Quartile\tUpper Quartile\t10th Percentile\t90th Percentile']
+    for base in range(1, longitud + 1):
+        media = 38 - base * 0.1 + aleatorio.random()
+        lineas.append(f'{base}\t{media:.2f}\t{media:.0f}\t{media - 3:.0f}\t{media + 2:.0f}\t{media - 6:.0f}\t{media + 3:.0f}')
+    lineas += ['>>END_MODULE', f'>>Per sequence GC content\t{estado()}', '#GC Content\tCount']
+    lineas += [f'{gc}\t{max(0.0, 100 - abs(gc - 50) * 4 + aleatorio.random()):.1f}' for gc in range(101)]
+    lineas += ['>>END_MODULE', f'>>Overrepresented sequences\t{estado()}', '#Sequence\tCount\tPercentage\tPossible Source',
+               '>>END_MODULE', f'>>Adapter Content\t{estado()}', '#Position\tIllumina Universal Adapter']
+    lineas += [f'{p}\t{p * 0.01:.2f}' for p in range(1, longitud + 1)]
+    lineas.append('>>END_MODULE')
+    return ('\n'.join(lineas) + '\n').encode()
+
+def generar_sam(lecturas=1000, contigs=3, longitud=5000, semilla=0):
+    aleatorio = random.Random(semilla)
+    lineas = ['@HD\tVN:1.0\tSO:unsorted']
+    lineas += [f'@SQ\tSN:contig_{c}\tLN:{longitud}' for c in range(contigs)]
+    for i in range(lecturas):
+        if aleatorio.random() < 0.1:
+            lineas.append(f'lectura_{i}\t4\t*\t0\t0\t*\t*\t0\t0\tACGT\tIIII')
+            continue
+        etiqueta = '\tXS:i:-5' if aleatorio.random() < 0.15 else ''
+        lineas.append(f'lectura_{i}\t0\tcontig_{aleatorio.randrange(contigs)}\t{aleatorio.randint(1, longitud - 50)}'
+                      f'\t{aleatorio.choice([0, 1, 23, 42])}\t4M\t*\t0\t0\tACGT\tIIII\tAS:i:0{etiqueta}')
+    return ('\n'.join(lineas) + '\n').encode()
+
+class GalaxyFalso:
+    """Estado en memoria + servidor HTTP que imita la API de Galaxy."""
+
+    def __init__(self, latencia_ms=(0, 0), duracion_jobs=0.0, tasa_error=0.0, tasa_error_jobs=0.0,
+                 historias=3, semilla=0):
+        self.latencia_ms = latencia_ms
+        self.duracion_jobs = duracion_jobs
+        self.tasa_error = tasa_error
+        self.tasa_error_jobs = tasa_error_jobs
+        self._aleatorio = random.Random(semilla)
+        self._ids = itertools.count(1)
+        self._bloqueo = threading.Lock()
+        self.historias = {}
+        self.datasets = {}
+        self.jobs = {}
+        self._servidor = None
+        for h in range(historias):
+            historia = self.crear_historia(f'Historia de prueba {h}')
+            self.crear_dataset(historia['id'], f'muestra_{h}_R1.fastq', 'fastqsanger', generar_fastq(semilla=h))
+            self.crear_dataset(historia['id'], f'muestra_{h}_R2.fastq', 'fastqsanger', generar_fastq(semilla=h + 100))
+            self.crear_dataset(historia['id'], f'genoma_{h}.fasta', 'fasta', generar_fasta(semilla=h))
+
+    # ---------------------------------------------------------
+    # Estado
+    # ---------------------------------------------------------
+    def _nuevo_id(self):
+        return f'{next(self._ids):016x}'
+
+    def crear_historia(self, nombre):
+        with self._bloqueo:
+            historia = {'id': self._nuevo_id(), 'name': nombre, 'update_time': _ahora_iso(), 'datasets': []}
+            self.historias[historia['id']] = historia
+        return historia
+
+    def crear_dataset(self, history_id, nombre, extension, contenido, job_id=None):
+        with self._bloqueo:
+            dataset = {'id': self._nuevo_id(), 'name': nombre, 'history_id': history_id, 'file_ext': extension,
+                       'contenido': contenido, 'job_id': job_id, 'update_time': _ahora_iso()}
+            self.datasets[dataset['id']] = dataset
+            historia = self.historias[history_id]
+            historia['datasets'].append(dataset['id'])
+            historia['update_time'] = dataset['update_time']
+        return dataset
+
+    def estado_job(self, job):
+        if time.time() < job['inicio'] + job['duracion']:
+            return 'running'
+        return 'error' if job['fallido'] else 'ok'
+
+    def estado_dataset(self, dataset):
+        return self.estado_job(self.jobs[dataset['job_id']]) if dataset['job_id'] else 'ok'
+
+    def ejecutar_herramienta(self, history_id, tool_id, entradas):
+        job = {'id': self._nuevo_id(), 'tool_id': tool_id, 'inicio': time.time(), 'duracion': self.duracion_jobs,
+               'fallido': self._aleatorio.random() < self.tasa_error_jobs, 'outputs': {}}
+        self.jobs[job['id']] = job
+
+        entrada = entradas.get('input_file') or entradas.get('input_1') or {}
+        origen = self.datasets.get(entrada.get('id') if isinstance(entrada, dict) else None)
+        nombre = origen['name'] if origen else 'entrada'
+        if 'fastqc' in tool_id:
+            salidas = {'html_file': ('html', f'<html><body><h1>FastQC {nombre}</h1></body></html>'.encode()),
+                       'text_file': ('txt', generar_fastqc_data(nombre, semilla=len(self.jobs)))}
+        elif 'bowtie2' in tool_id:
+            salidas = {'output': ('sam' if entradas.get('sam_opt') else 'bam', generar_sam(semilla=len(self.jobs)))}
+        else:
+            salidas = {'output': ('txt', b'resultado\n')}
+
+        herramienta = tool_id.split('/')[-2] if '/' in tool_id else tool_id
+        for clave, (extension, contenido) in salidas.items():
+            dataset = self.crear_dataset(history_id, f'{herramienta} on {nombre}: {clave}', extension, contenido,
+                                         job_id=job['id'])
+            job['outputs'][clave] = {'id': dataset['id'], 'src': 'hda'}
+        return job
+
+    # ---------------------------------------------------------
+    # Representaciones JSON
+    # ---------------------------------------------------------
+    def json_historia(self, historia):
+        return {'id': historia['id'], 'name': historia['name'], 'update_time': historia['update_time'],
+                'count': len(historia['datasets']), 'deleted': False}
+
+    def json_dataset(self, dataset):
+        return {'id': dataset['id'], 'name': dataset['name'], 'history_id': dataset['history_id'],
+                'type': 'file', 'history_content_type': 'dataset', 'file_ext': dataset['file_ext'],
+                'extension': dataset['file_ext'], 'state': self.estado_dataset(dataset), 'deleted': False,
+                'visible': True, 'file_size': len(dataset['contenido']), 'update_time': dataset['update_time'],
+                'download_url': f"/api/histories/{dataset['history_id']}/contents/{dataset['id']}/display"}
+
+    def json_job(self, job):
+        return {'id': job['id'], 'tool_id': job['tool_id'], 'state': self.estado_job(job), 'outputs': job['outputs']}
+
+    def json_ejecucion(self, job):
+        return {'jobs': [{'id': job['id'], 'tool_id': job['tool_id'], 'state': 'queued'}],
+                'outputs': [dict(self.json_dataset(self.datasets[o['id']]), output_name=nombre)
+                            for nombre, o in job['outputs'].items()]}
+
+    # ---------------------------------------------------------
+    # Servidor HTTP
+    # ---------------------------------------------------------
+    def iniciar(self, host='127.0.0.1', puerto=0):
+        """Arranca el servidor en un hilo de fondo y devuelve su URL base."""
+        galaxy = self
+
+        class Manejador(ManejadorGalaxyFalso):
+            estado = galaxy
+
+        self._servidor = ThreadingHTTPServer((host, puerto), Manejador)
+        self._servidor.daemon_threads = True
+        threading.Thread(target=self._servidor.serve_forever, name='galaxy-falso', daemon=True).start()
+        return f'http://{host}:{self._servidor.server_address[1]}'
+
+    def detener(self):
+        if self._servidor:
+            self._servidor.shutdown()
+            self._servidor.server_close()
+
+class ManejadorGalaxyFalso(BaseHTTPRequestHandler):
+    estado = None       # GalaxyFalso, se asigna en GalaxyFalso.iniciar()
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, formato, *args):
+        pass
+
+    def _responder(self, codigo, cuerpo, tipo='application/json'):
+        if not isinstance(cuerpo, bytes):
+            cuerpo = json.dumps(cuerpo).encode()
+        self.send_response(codigo)
+        self.send_header('Content-Type', tipo)
+        self.send_header('Content-Length', str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def _simular_red(self):
+        """Aplica la latencia configurada; devuelve True si se debe simular un error 500."""
+        minimo, maximo = self.estado.latencia_ms
+        if maximo > 0:
+            time.sleep(random.uniform(minimo, maximo) / 1000.0)
+        return random.random() < self.estado.tasa_error
+
+    def _leer_cuerpo(self):
+        longitud = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(longitud) if longitud else b''
+
+    def do_GET(self):
+        if self._simular_red():
+            return self._responder(500, {'err_msg': 'Error simulado'})
+
+        g = self.estado
+        ruta = urlparse(self.path).path.rstrip('/')
+        if ruta == '/api/version':
+            return self._responder(200, VERSION_GALAXY)
+        if ruta == '/api/histories':
+            return self._responder(200, [g.json_historia(h) for h in g.historias.values()])
+
+        m = re.fullmatch(r'/api/histories/(\w+)(/contents)?', ruta)
+        if m and m.group(1) in g.historias:
+            historia = g.historias[m.group(1)]
+            if m.group(2):
+                return self._responder(200, [g.json_dataset(g.datasets[d]) for d in historia['datasets']])
+            return self._responder(200, g.json_historia(historia))
+
+        m = re.fullmatch(r'/api/(?:datasets|histories/\w+/contents)/(\w+)(/display)?', ruta)
+        if m and m.group(1) in g.datasets:
+            dataset = g.datasets[m.group(1)]
+            if m.group(2):
+                return self._responder(200, dataset['contenido'], 'application/octet-stream')
+            return self._responder(200, g.json_dataset(dataset))
+
+        m = re.fullmatch(r'/api/jobs/(\w+)', ruta)
+        if m and m.group(1) in g.jobs:
+            return self._responder(200, g.json_job(g.jobs[m.group(1)]))
+
+        return self._responder(404, {'err_msg': f'No encontrado: {ruta}'})
+
+    def do_POST(self):
+        cuerpo = self._leer_cuerpo()
+        if self._simular_red():
+            return self._responder(500, {'err_msg': 'Error simulado'})
+
+        g = self.estado
+        ruta = urlparse(self.path).path.rstrip('/')
+        tipo = self.headers.get('Content-Type', '')
+
+        if ruta == '/api/histories':
+            datos = json.loads(cuerpo or b'{}')
+            return self._responder(200, g.json_historia(g.crear_historia(datos.get('name', 'Unnamed history'))))
+
+        if ruta == '/api/tools' and tipo.startswith('multipart/form-data'):
+            # Subida legacy de bioblend (upload1): campos + files_0|file_data
+            mensaje = BytesParser(policy=politica_email).parsebytes(
+                f'Content-Type: {tipo}\r\n\r\n'.encode() + cuerpo)
+            campos, contenido = {}, b''
+            for parte in mensaje.iter_parts():
+                nombre = parte.get_param('name', header='content-disposition')
+                if nombre == 'files_0|file_data':
+                    contenido = parte.get_payload(decode=True)
+                else:
+                    campos[nombre] = parte.get_content()
+            entradas = json.loads(campos.get('inputs') or '{}')
+            history_id = campos.get('history_id')
+            if history_id not in g.historias:
+                return self._responder(400, {'err_msg': 'Historia inexistente'})
+            dataset = g.crear_dataset(history_id, entradas.get('files_0|NAME', 'subida'),
+                                      entradas.get('file_type', 'auto'), contenido)
+            return self._responder(200, {'outputs': [g.json_dataset(dataset)], 'jobs': []})
+
+        if ruta == '/api/tools':
+            datos = json.loads(cuerpo or b'{}')
+            if datos.get('history_id') not in g.historias:
+                return self._responder(400, {'err_msg': 'Historia inexistente'})
+            job = g.ejecutar_herramienta(datos['history_id'], datos.get('tool_id', ''), datos.get('inputs', {}))
+            return self._responder(200, g.json_ejecucion(job))
+
+        return self._responder(404, {'err_msg': f'No encontrado: {ruta}'})
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Servidor Galaxy falso para pruebas de rendimiento')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--puerto', type=int, default=8081)
+    parser.add_argument('--latencia-ms', type=float, nargs=2, default=(0, 0), metavar=('MIN', 'MAX'))
+    parser.add_argument('--duracion-jobs', type=float, default=0.0, help='segundos hasta que un job termina')
+    parser.add_argument('--tasa-error', type=float, default=0.0, help='fracción de peticiones que responden 500')
+    parser.add_argument('--tasa-error-jobs', type=float, default=0.0, help='fracción de jobs que terminan en error')
+    parser.add_argument('--historias', type=int, default=3)
+    args = parser.parse_args()
+
+    galaxy = GalaxyFalso(tuple(args.latencia_ms), args.duracion_jobs, args.tasa_error,
+                         args.tasa_error_jobs, args.historias)
+    print(f'Galaxy falso escuchando en {galaxy.iniciar(args.host, args.puerto)}')
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        galaxy.detener()
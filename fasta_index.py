@@ -0,0 +1,203 @@
+import json
+import mmap
+import os
+import re
+import tempfile
+import threading
+
+class IndiceFastaError(ValueError):
+    """El FASTA no se puede indexar (líneas de longitud irregular, contigs duplicados...)."""
+
+def construir_indice(ruta_fasta):
+    """
+    Recorre el FASTA una sola vez y escribe `<ruta>.fai` (compatible con samtools faidx)
+    y `<ruta>.stats.json` con el conteo de GC y N por contig.
+    Devuelve la lista de entradas del índice.
+    """
+    entradas = []
+    actual = None
+    offset = 0
+
+    def cerrar(entrada):
+        if entrada and entrada['linebases'] is None:
+            entrada['linebases'] = entrada['linewidth'] = 0
+        if entrada:
+            entradas.append(entrada)
+
+    with open(ruta_fasta, 'rb') as f:
+        for linea in f:
+            tam_linea = len(linea)
+            if linea.startswith(b'>'):
+                cerrar(actual)
+                nombre = linea[1:].split(None, 1)[0].decode() if linea[1:].strip() else ''
+                actual = {'nombre': nombre, 'longitud': 0, 'offset': offset + tam_linea,
+                          'linebases': None, 'linewidth': None, 'gc': 0, 'n': 0, 'ultima_corta': False}
+            elif actual is not None:
+                secuencia = linea.rstrip(b'\r\n')
+                bases = len(secuencia)
+                if bases:
+                    if actual['ultima_corta']:
+                        raise IndiceFastaError(f"Líneas de longitud irregular en el contig '{actual['nombre']}'")
+                    if actual['linebases'] is None:
+                        actual['linebases'], actual['linewidth'] = bases, tam_linea
+                    elif bases != actual['linebases'] or tam_linea != actual['linewidth']:
+                        # Solo la última línea del contig puede ser más corta
+                        if bases > actual['linebases']:
+                            raise IndiceFastaError(f"Líneas de longitud irregular en el contig '{actual['nombre']}'")
+                        actual['ultima_corta'] = True
+                    actual['longitud'] += bases
+                    mayus = secuencia.upper()
+                    actual['gc'] += mayus.count(b'G') + mayus.count(b'C')
+                    actual['n'] += mayus.count(b'N')
+                elif actual['linebases'] is not None:
+                    actual['ultima_corta'] = True
+            offset += tam_linea
+        cerrar(actual)
+
+    nombres = [e['nombre'] for e in entradas]
+    if len(set(nombres)) != len(nombres):
+        raise IndiceFastaError("El FASTA contiene nombres de contig duplicados")
+
+    # El .fai se publica el último: si existe y está al día, el .stats.json también lo está
+    _escribir_atomico(ruta_fasta + '.stats.json',
+                      json.dumps({e['nombre']: {'gc': e['gc'], 'n': e['n']} for e in entradas}))
+    _escribir_atomico(ruta_fasta + '.fai', ''.join(
+        f"{e['nombre']}\t{e['longitud']}\t{e['offset']}\t{e['linebases']}\t{e['linewidth']}\n" for e in entradas))
+
+    return entradas
+
+def _escribir_atomico(ruta, contenido):
+    """Escribe en un temporal del mismo directorio y lo renombra: otro proceso nunca ve el archivo a medias."""
+    descriptor, temporal = tempfile.mkstemp(dir=os.path.dirname(ruta) or '.', suffix='.tmp')
+    try:
+        with os.fdopen(descriptor, 'w') as f:
+            f.write(contenido)
+        os.chmod(temporal, 0o644)      # mkstemp crea con 0600; el índice es legible como cualquier .fai
+        os.replace(temporal, ruta)
+    except BaseException:
+        os.remove(temporal)
+        raise
+
+def cargar_indice(ruta_fasta):
+    """Lee `<ruta>.fai` y `<ruta>.stats.json`; los construye si faltan o están desactualizados."""
+    ruta_fai = ruta_fasta + '.fai'
+    ruta_stats = ruta_fasta + '.stats.json'
+    vigente = all(os.path.exists(r) and os.path.getmtime(r) >= os.path.getmtime(ruta_fasta)
+                  for r in (ruta_fai, ruta_stats))
+    if not vigente:
+        construir_indice(ruta_fasta)
+
+    with open(ruta_stats) as f:
+        stats = json.load(f)
+    entradas = []
+    with open(ruta_fai) as fai:
+        for linea in fai:
+            nombre, longitud, offset, linebases, linewidth = linea.rstrip('\n').split('\t')[:5]
+            entradas.append({
+                'nombre': nombre,
+                'longitud': int(longitud),
+                'offset': int(offset),
+                'linebases': int(linebases),
+                'linewidth': int(linewidth),
+                'gc': stats.get(nombre, {}).get('gc'),
+                'n': stats.get(nombre, {}).get('n')
+            })
+    return entradas
+
+def parsear_region(region, contigs=()):
+    """
+    'chr1:1,000-2,000' -> ('chr1', 1000, 2000); 'chr1' -> ('chr1', None, None).
+    Como samtools, si la cadena completa es un contig de `contigs` (p. ej. 'HLA:01:01') no se trocea.
+    """
+    if region.strip() in contigs:
+        return region.strip(), None, None
+    coincidencia = re.match(r'^(.+?)(?::([\d,]+)(?:-([\d,]+))?)?$', region.strip())
+    if not coincidencia:
+        raise ValueError(f"Región inválida: {region}")
+    nombre, inicio, fin = coincidencia.groups()
+    inicio = int(inicio.replace(',', '')) if inicio else None
+    fin = int(fin.replace(',', '')) if fin else None
+    return nombre, inicio, fin
+
+class FastaIndexado:
+    """Acceso aleatorio a un FASTA indexado mediante mmap (el archivo no se lee completo)."""
+
+    def __init__(self, ruta_fasta):
+        self.ruta = ruta_fasta
+        self.entradas = cargar_indice(ruta_fasta)
+        self.contigs = {e['nombre']: e for e in self.entradas}
+        self._archivo = open(ruta_fasta, 'rb')
+        self._mmap = mmap.mmap(self._archivo.fileno(), 0, access=mmap.ACCESS_READ) \
+            if os.path.getsize(ruta_fasta) else b''
+
+    def cerrar(self):
+        if isinstance(self._mmap, mmap.mmap):
+            self._mmap.close()
+        self._archivo.close()
+
+    def _posicion_en_bytes(self, contig, pos):
+        """Offset en el archivo de la base `pos` (0-based) del contig."""
+        if not contig['linebases']:
+            return contig['offset']
+        lineas, columna = divmod(pos, contig['linebases'])
+        return contig['offset'] + lineas * contig['linewidth'] + columna
+
+    def region(self, nombre, inicio=None, fin=None):
+        """Secuencia de `nombre` entre `inicio` y `fin` (1-based, inclusivos, como samtools faidx)."""
+        contig = self.contigs.get(nombre)
+        if contig is None:
+            raise KeyError(nombre)
+        inicio = max(1, inicio or 1)
+        fin = min(contig['longitud'], fin or contig['longitud'])
+        if fin < inicio:
+            return ''
+
+        desde = self._posicion_en_bytes(contig, inicio - 1)
+        hasta = self._posicion_en_bytes(contig, fin - 1) + 1
+        # memoryview evita copiar el bloque del mmap; solo se copia al quitar los saltos de línea
+        with memoryview(self._mmap)[desde:hasta] as vista:
+            return bytes(vista).replace(b'\n', b'').replace(b'\r', b'').decode('ascii')
+
+    def resumen(self):
+        """Estadísticas por contig listas para serializar a JSON."""
+        contigs = [{
+            'nombre': e['nombre'],
+            'longitud': e['longitud'],
+            'gc_porcentaje': round(100.0 * e['gc'] / (e['longitud'] - e['n']), 2)
+            if e['gc'] is not None and e['longitud'] > e['n'] else None,
+            'n': e['n']
+        } for e in self.entradas]
+        return {
+            'num_contigs': len(contigs),
+            'longitud_total': sum(c['longitud'] for c in contigs),
+            'contigs': contigs
+        }
+
+# Índices abiertos por ruta (se reutilizan entre peticiones). El lock global solo protege los
+# diccionarios; la indexación se hace bajo el lock de su ruta, sin frenar al resto de referencias
+_abiertos = {}
+_bloqueos_ruta = {}
+_bloqueo = threading.Lock()
+
+def obtener_fasta_indexado(ruta_fasta):
+    """Devuelve el FastaIndexado cacheado para la ruta (lo abre e indexa la primera vez)."""
+    with _bloqueo:
+        fasta = _abiertos.get(ruta_fasta)
+        if fasta is not None:
+            return fasta
+        bloqueo_ruta = _bloqueos_ruta.setdefault(ruta_fasta, threading.Lock())
+
+    with bloqueo_ruta:
+        # Otro hilo pudo abrirlo mientras esperábamos
+        with _bloqueo:
+            fasta = _abiertos.get(ruta_fasta)
+        if fasta is None:
+            fasta = FastaIndexado(ruta_fasta)
+            with _bloqueo:
+                _abiertos[ruta_fasta] = fasta
+        return fasta
+
+def olvidar_fasta_indexado(ruta_fasta):
+    """Quita la ruta de la caché de índices abiertos (las lecturas en curso conservan su mmap)."""
+    with _bloqueo:
+        _abiertos.pop(ruta_fasta, None)
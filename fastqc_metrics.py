@@ -0,0 +1,166 @@
+from models import (db, EstadisticaFastqc, ModuloFastqc, CalidadPorBase, ContenidoGC,
+                    SecuenciaSobrerrepresentada, ContenidoAdaptador)
+
+# Tablas que se rellenan a partir de fastqc_data.txt (se limpian antes de reimportar)
+TABLAS_METRICAS = [EstadisticaFastqc, ModuloFastqc, CalidadPorBase, ContenidoGC,
+                   SecuenciaSobrerrepresentada, ContenidoAdaptador]
+
+def parsear_fastqc_data(texto):
+    """
+    Convierte el contenido de fastqc_data.txt en un dict por módulo:
+    {'Per base sequence quality': {'estado': 'pass', 'columnas': [...], 'filas': [[...], ...]}, ...}
+    """
+    modulos = {}
+    actual = None
+    for linea in texto.splitlines():
+        if linea.startswith('>>END_MODULE'):
+            actual = None
+        elif linea.startswith('>>'):
+            nombre, _, estado = linea[2:].partition('\t')
+            actual = {'estado': estado.strip().lower(), 'columnas': [], 'filas': []}
+            modulos[nombre.strip()] = actual
+        elif actual is None or not linea.strip():
+            continue
+        elif linea.startswith('#'):
+            # Algunos módulos tienen varias líneas '#'; la cabecera es la última antes de los datos
+            if not actual['filas']:
+                actual['columnas'] = linea[1:].split('\t')
+        else:
+            actual['filas'].append(linea.split('\t'))
+    return modulos
+
+def _rango(valor):
+    """'10-14' -> (10, 14); '7' -> (7, 7)."""
+    inicio, _, fin = valor.strip().partition('-')
+    return int(inicio), int(fin or inicio)
+
+def _numero(valor):
+    try:
+        return float(valor)
+    except (TypeError, ValueError):
+        return None
+
+def filas_de_metricas(resultado_id, modulos):
+    """Traduce los módulos parseados a filas por tabla: {Modelo: [dict, ...]}."""
+    filas = {modelo: [] for modelo in TABLAS_METRICAS}
+
+    for nombre, modulo in modulos.items():
+        filas[ModuloFastqc].append({'resultado_id': resultado_id, 'modulo': nombre, 'estado': modulo['estado']})
+
+    basicas = {f[0]: f[1] for f in modulos.get('Basic Statistics', {}).get('filas', []) if len(f) > 1}
+    if basicas:
+        longitud_min, longitud_max = _rango(basicas.get('Sequence length', '0'))
+        filas[EstadisticaFastqc].append({
+            'resultado_id': resultado_id,
+            'archivo': basicas.get('Filename'),
+            'codificacion': basicas.get('Encoding'),
+            'total_secuencias': int(basicas.get('Total Sequences', 0)),
+            'secuencias_baja_calidad': int(basicas.get('Sequences flagged as poor quality', 0)),
+            'longitud_min': longitud_min,
+            'longitud_max': longitud_max,
+            'gc_porcentaje': _numero(basicas.get('%GC'))
+        })
+
+    for f in modulos.get('Per base sequence quality', {}).get('filas', []):
+        base_inicio, base_fin = _rango(f[0])
+        valores = [_numero(v) for v in f[1:7]] + [None] * (6 - len(f[1:7]))
+        filas[CalidadPorBase].append(dict(
+            zip(['media', 'mediana', 'cuartil_inferior', 'cuartil_superior', 'percentil_10', 'percentil_90'], valores),
+            resultado_id=resultado_id, base_inicio=base_inicio, base_fin=base_fin
+        ))
+
+    for f in modulos.get('Per sequence GC content', {}).get('filas', []):
+        filas[ContenidoGC].append({'resultado_id': resultado_id, 'gc': int(float(f[0])), 'conteo': float(f[1])})
+
+    for f in modulos.get('Overrepresented sequences', {}).get('filas', []):
+        filas[SecuenciaSobrerrepresentada].append({
+            'resultado_id': resultado_id,
+            'secuencia': f[0],
+            'conteo': int(f[1]),
+            'porcentaje': _numero(f[2]),
+            'fuente': f[3] if len(f) > 3 else None
+        })
+
+    adaptadores = modulos.get('Adapter Content', {})
+    for f in adaptadores.get('filas', []):
+        posicion_inicio, posicion_fin = _rango(f[0])
+        for adaptador, valor in zip(adaptadores['columnas'][1:], f[1:]):
+            filas[ContenidoAdaptador].append({
+                'resultado_id': resultado_id,
+                'posicion_inicio': posicion_inicio,
+                'posicion_fin': posicion_fin,
+                'adaptador': adaptador,
+                'porcentaje': float(valor)
+            })
+
+    return filas
+
+def guardar_metricas_fastqc(resultado_id, texto):
+    """Parsea fastqc_data.txt y reemplaza las métricas guardadas para un resultado."""
+    filas = filas_de_metricas(resultado_id, parsear_fastqc_data(texto))
+    for modelo in TABLAS_METRICAS:
+        modelo.query.filter_by(resultado_id=resultado_id).delete()
+        if filas[modelo]:
+            # executemany en una sola sentencia por tabla
+            db.session.execute(modelo.__table__.insert(), filas[modelo])
+    db.session.commit()
+    return {modelo.__tablename__: len(filas[modelo]) for modelo in TABLAS_METRICAS}
+
+def importar_metricas_fastqc(gi, resultado_id, galaxy_output_id):
+    """Descarga una sola vez la salida RawData de FastQC desde Galaxy y guarda sus métricas."""
+    contenido = gi.datasets.download_dataset(galaxy_output_id)
+    if isinstance(contenido, bytes):
+        contenido = contenido.decode('utf-8', errors='replace')
+    return guardar_metricas_fastqc(resultado_id, contenido)
+
+# Códigos compactos para el heatmap pass/warn/fail
+CODIGOS_ESTADO = {'pass': 0, 'warn': 1, 'fail': 2}
+
+def resumen_multimuestra(resultado_ids):
+    """
+    Agrega las métricas guardadas de varias muestras en columnas alineadas
+    (una consulta por tabla) listas para graficar en el cliente.
+    """
+    posicion = {rid: i for i, rid in enumerate(resultado_ids)}
+    n = len(resultado_ids)
+
+    estadisticas = {e.resultado_id: e for e in
+                    EstadisticaFastqc.query.filter(EstadisticaFastqc.resultado_id.in_(resultado_ids))}
+    muestras = [estadisticas[rid].archivo if rid in estadisticas else f'resultado {rid}' for rid in resultado_ids]
+    lecturas = [estadisticas[rid].total_secuencias if rid in estadisticas else None for rid in resultado_ids]
+
+    # Calidad media por base: eje común = unión de posiciones de todas las muestras
+    filas_calidad = db.session.query(CalidadPorBase.resultado_id, CalidadPorBase.base_inicio, CalidadPorBase.media) \
+        .filter(CalidadPorBase.resultado_id.in_(resultado_ids)).all()
+    bases = sorted({f.base_inicio for f in filas_calidad})
+    indice_base = {b: i for i, b in enumerate(bases)}
+    medias = [[None] * len(bases) for _ in range(n)]
+    for rid, base, media in filas_calidad:
+        medias[posicion[rid]][indice_base[base]] = round(media, 2) if media is not None else None
+
+    # Distribución de GC normalizada (fracción de lecturas por % GC)
+    gc = [[0.0] * 101 for _ in range(n)]
+    for rid, valor, conteo in db.session.query(ContenidoGC.resultado_id, ContenidoGC.gc, ContenidoGC.conteo) \
+            .filter(ContenidoGC.resultado_id.in_(resultado_ids)):
+        gc[posicion[rid]][valor] = conteo
+    for fila in gc:
+        total = sum(fila) or 1.0
+        fila[:] = [round(v / total, 4) for v in fila]
+
+    # Matriz de estados por módulo
+    filas_modulos = db.session.query(ModuloFastqc.resultado_id, ModuloFastqc.modulo, ModuloFastqc.estado) \
+        .filter(ModuloFastqc.resultado_id.in_(resultado_ids)).all()
+    nombres_modulos = sorted({f.modulo for f in filas_modulos})
+    indice_modulo = {m: i for i, m in enumerate(nombres_modulos)}
+    estados = [[None] * len(nombres_modulos) for _ in range(n)]
+    for rid, modulo, estado in filas_modulos:
+        estados[posicion[rid]][indice_modulo[modulo]] = CODIGOS_ESTADO.get(estado)
+
+    return {
+        'resultado_ids': list(resultado_ids),
+        'muestras': muestras,
+        'lecturas': lecturas,
+        'calidad': {'bases': bases, 'medias': medias},
+        'gc': gc,
+        'modulos': {'nombres': nombres_modulos, 'estados': estados}
+    }
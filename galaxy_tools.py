@@ -74,7 +74,8 @@ def ejecutar_fastqc(gi, history_id, datasetID_R1, datasetID_R2=None):
     for job_id in jobs:
         job_info = gi.jobs.show_job(job_id)
         outputs_dict = job_info.get("outputs", {})
-        fastqc_outputs = list(outputs_dict.values())
+        # Conservar el nombre del output (html_file, text_file) junto a su id
+        fastqc_outputs = [dict(output, name=nombre) for nombre, output in outputs_dict.items()]
         results.append({
             "job_id": job_id,
             "outputs": fastqc_outputs
@@ -157,10 +158,23 @@ def ejecutar_fastqc(gi, history_id, datasetID_R1, datasetID_R2=None):
     for job_id in jobs:
         job_info = gi.jobs.show_job(job_id)
         outputs_dict = job_info.get("outputs", {})
-        fastqc_outputs = list(outputs_dict.values())
+        # Conservar el nombre del output (html_file, text_file) junto a su id
+        fastqc_outputs = [dict(output, name=nombre) for nombre, output in outputs_dict.items()]
         results.append({
             "job_id": job_id,
             "outputs": fastqc_outputs
         })
         
     return results
+
+def descargar_dataset_en_bloques(gi, dataset_id, tam_bloque=1024 * 1024):
+    """
+    Descarga un dataset de Galaxy como iterador de bloques de bytes,
+    sin cargar el archivo completo en memoria.
+    """
+    dataset = gi.datasets.show_dataset(dataset_id)
+    if dataset.get("state") != "ok":
+        raise RuntimeError(f"El dataset {dataset_id} no está listo (estado: {dataset.get('state')})")
+    respuesta = gi.make_get_request(f"{gi.base_url}{dataset['download_url']}", stream=True)
+    respuesta.raise_for_status()
+    return respuesta.iter_content(chunk_size=tam_bloque)
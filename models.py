@@ -19,3 +19,106 @@ class Historia(db.Model):
     nombre = db.Column(db.String(200), nullable=False)
     fecha_creacion = db.Column(db.DateTime, default=datetime.utcnow)
     usuario_id = db.Column(db.Integer, db.ForeignKey('usuarios.id'), nullable=False)
+
+# ---------------------------------------------------------
+# Métricas de FastQC (una fila por valor, ligadas a resultados.id)
+# ---------------------------------------------------------
+class EstadisticaFastqc(db.Model):
+    __tablename__ = 'fastqc_estadisticas'
+    id = db.Column(db.Integer, primary_key=True)
+    resultado_id = db.Column(db.Integer, db.ForeignKey('resultados.id'), nullable=False, unique=True)
+    archivo = db.Column(db.String(300))
+    codificacion = db.Column(db.String(100))
+    total_secuencias = db.Column(db.BigInteger)
+    secuencias_baja_calidad = db.Column(db.BigInteger)
+    longitud_min = db.Column(db.Integer)
+    longitud_max = db.Column(db.Integer)
+    gc_porcentaje = db.Column(db.Float)
+
+class ModuloFastqc(db.Model):
+    __tablename__ = 'fastqc_modulos'
+    id = db.Column(db.Integer, primary_key=True)
+    resultado_id = db.Column(db.Integer, db.ForeignKey('resultados.id'), nullable=False, index=True)
+    modulo = db.Column(db.String(100), nullable=False)
+    estado = db.Column(db.String(10), nullable=False)              # pass / warn / fail
+    __table_args__ = (db.Index('ix_fastqc_modulos_modulo_estado', 'modulo', 'estado'),)
+
+class CalidadPorBase(db.Model):
+    __tablename__ = 'fastqc_calidad_base'
+    id = db.Column(db.Integer, primary_key=True)
+    resultado_id = db.Column(db.Integer, db.ForeignKey('resultados.id'), nullable=False)
+    base_inicio = db.Column(db.Integer, nullable=False)
+    base_fin = db.Column(db.Integer, nullable=False)
+    media = db.Column(db.Float)
+    mediana = db.Column(db.Float)
+    cuartil_inferior = db.Column(db.Float)
+    cuartil_superior = db.Column(db.Float)
+    percentil_10 = db.Column(db.Float)
+    percentil_90 = db.Column(db.Float)
+    __table_args__ = (db.Index('ix_fastqc_calidad_base_resultado', 'resultado_id', 'base_inicio'),)
+
+class ContenidoGC(db.Model):
+    __tablename__ = 'fastqc_contenido_gc'
+    id = db.Column(db.Integer, primary_key=True)
+    resultado_id = db.Column(db.Integer, db.ForeignKey('resultados.id'), nullable=False)
+    gc = db.Column(db.SmallInteger, nullable=False)               # % GC (0-100)
+    conteo = db.Column(db.Float, nullable=False)
+    __table_args__ = (db.Index('ix_fastqc_contenido_gc_resultado', 'resultado_id', 'gc'),)
+
+class SecuenciaSobrerrepresentada(db.Model):
+    __tablename__ = 'fastqc_sobrerrepresentadas'
+    id = db.Column(db.Integer, primary_key=True)
+    resultado_id = db.Column(db.Integer, db.ForeignKey('resultados.id'), nullable=False, index=True)
+    secuencia = db.Column(db.String(500), nullable=False)
+    conteo = db.Column(db.BigInteger)
+    porcentaje = db.Column(db.Float)
+    fuente = db.Column(db.String(300))
+
+class ContenidoAdaptador(db.Model):
+    __tablename__ = 'fastqc_adaptadores'
+    id = db.Column(db.Integer, primary_key=True)
+    resultado_id = db.Column(db.Integer, db.ForeignKey('resultados.id'), nullable=False)
+    posicion_inicio = db.Column(db.Integer, nullable=False)
+    posicion_fin = db.Column(db.Integer, nullable=False)
+    adaptador = db.Column(db.String(100), nullable=False)
+    porcentaje = db.Column(db.Float, nullable=False)
+    __table_args__ = (db.Index('ix_fastqc_adaptadores_resultado', 'resultado_id', 'adaptador'),)
+
+# ---------------------------------------------------------
+# Resumen de alineamientos (Bowtie2)
+# ---------------------------------------------------------
+class ResumenAlineamiento(db.Model):
+    __tablename__ = 'resumen_alineamientos'
+    id = db.Column(db.Integer, primary_key=True)
+    # resultado_id único: insertar la fila 'procesando' reserva el cálculo entre workers
+    resultado_id = db.Column(db.Integer, db.ForeignKey('resultados.id'), nullable=False, unique=True)
+    estado = db.Column(db.String(20), nullable=False, default='completado')  # procesando / completado / error
+    error = db.Column(db.Text)
+    actualizado_en = db.Column(db.DateTime, default=datetime.utcnow)       # latido del hilo que lo calcula
+    total_lecturas = db.Column(db.BigInteger)
+    mapeadas = db.Column(db.BigInteger)
+    no_mapeadas = db.Column(db.BigInteger)
+    multimapeadas = db.Column(db.BigInteger)
+    pareadas = db.Column(db.BigInteger)
+    pareadas_correctamente = db.Column(db.BigInteger)
+    alineamientos_secundarios = db.Column(db.BigInteger)
+    histograma_mapq = db.Column(db.JSON)                           # [conteo por MAPQ]
+    cobertura = db.Column(db.JSON)                                 # {referencia: {longitud, tam_bin, profundidad_media}}
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'resultado_id': self.resultado_id,
+            'estado': self.estado,
+            'total_lecturas': self.total_lecturas,
+            'mapeadas': self.mapeadas,
+            'no_mapeadas': self.no_mapeadas,
+            'multimapeadas': self.multimapeadas,
+            'pareadas': self.pareadas,
+            'pareadas_correctamente': self.pareadas_correctamente,
+            'tasa_pareadas_correctamente': round(self.pareadas_correctamente / self.pareadas, 4) if self.pareadas else None,
+            'alineamientos_secundarios': self.alineamientos_secundarios,
+            'histograma_mapq': self.histograma_mapq,
+            'cobertura': self.cobertura,
+            'created_at': self.created_at.isoformat()
+        }
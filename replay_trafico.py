@@ -0,0 +1,167 @@
+"""
+Reproduce contra una instancia en marcha el tráfico capturado por captura_trafico.py.
+
+Respeta los intervalos originales entre peticiones (o los escala con --velocidad)
+y reporta la distribución de latencias por ruta junto a la latencia original.
+
+Los identificadores de Galaxy del cuerpo JSON (history_id, datasetID_R1/R2...) se reproducen
+tal cual: la instancia de destino debe usar el mismo Galaxy (o uno de pruebas con esos ids),
+y las rutas como /api/iniciar_analisis lanzarán jobs reales en él.
+
+Todas las peticiones salen de la misma IP: conviene subir LOGIN_MAX_INTENTOS_IP en la
+instancia de destino para no medir el limitador de intentos de login.
+
+Uso:
+    python replay_trafico.py requests.jsonl --url http://127.0.0.1:5000 --velocidad 2
+    python replay_trafico.py requests.jsonl --url http://127.0.0.1:5000 --velocidad 0   # lo más rápido posible
+"""
+import argparse
+import json
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import requests
+
+from benchmark import commit_actual, iniciar_sesion, resumir_latencias
+from captura_trafico import REDACTADO
+
+# Rutas de autenticación: se reproducen con una sesión desechable para no cerrar las de las cubetas
+RUTAS_AUTENTICACION = {'/login', '/register', '/logout'}
+MAX_BYTES_ARCHIVO = 50 * 1024 * 1024
+
+def cargar_entradas(ruta_archivo):
+    entradas = []
+    with open(ruta_archivo) as f:
+        for linea in f:
+            linea = linea.strip()
+            if not linea:
+                continue
+            try:
+                entrada = json.loads(linea)
+            except json.JSONDecodeError:
+                continue
+            if 'ts' in entrada and 'path' in entrada:
+                entradas.append(entrada)
+    return sorted(entradas, key=lambda e: e['ts'])
+
+def sintetizar(forma):
+    """Construye un valor JSON con la forma registrada (solo los identificadores conservan su valor)."""
+    if isinstance(forma, dict) and forma.keys() == {'literal'}:
+        return forma['literal']
+    if isinstance(forma, dict) and 'lista' in forma and 'elemento' in forma:
+        return [sintetizar(forma['elemento']) for _ in range(forma['lista'])]
+    if isinstance(forma, dict):
+        return {k: sintetizar(v) for k, v in forma.items()}
+    return {'str': 'replay', 'int': 0, 'float': 0.0, 'bool': False, 'null': None, 'dict': {}}.get(forma)
+
+def construir_peticion(entrada, usuario, password):
+    """Argumentos de requests.request() equivalentes a una entrada del log."""
+    argumentos = {'allow_redirects': False,
+                  'params': {k: '' if v == REDACTADO else v for k, v in (entrada.get('query') or {}).items()}}
+    if entrada.get('json') is not None:
+        argumentos['json'] = sintetizar(entrada['json'])
+    if entrada.get('formulario'):
+        formulario = {k: 'replay' for k in entrada['formulario']}
+        for clave in ('username', 'password', 'confirm_password'):
+            if clave in formulario:
+                formulario[clave] = usuario if clave == 'username' else password
+        argumentos['data'] = formulario
+    if entrada.get('archivos'):
+        argumentos['files'] = {
+            k: ('replay.fastq', b'N' * min(a.get('tamano') or 0, MAX_BYTES_ARCHIVO), a.get('tipo'))
+            for k, a in entrada['archivos'].items()
+        }
+    return argumentos
+
+def reproducir(entradas, url, velocidad, usuario, password, max_hilos):
+    """Lanza cada petición en su instante (escalado) y devuelve latencias y estados por ruta."""
+    sesiones = {}
+    bloqueo = threading.Lock()
+    latencias = defaultdict(list)
+    estados = defaultdict(Counter)
+
+    def sesion_de(cubeta):
+        with bloqueo:
+            if cubeta not in sesiones:
+                sesiones[cubeta] = iniciar_sesion(url, f'{usuario}_{cubeta}', password)
+            return sesiones[cubeta]
+
+    def enviar(entrada):
+        ruta = entrada.get('ruta') or entrada['path']
+        cubeta = entrada.get('cubeta_usuario')
+        credenciales = (f'{usuario}_{cubeta}', password)
+        if entrada['path'] in RUTAS_AUTENTICACION or cubeta is None:
+            sesion = requests.Session()
+        else:
+            sesion = sesion_de(cubeta)
+
+        inicio = time.perf_counter()
+        try:
+            codigo = sesion.request(entrada['metodo'], url + entrada['path'],
+                                    **construir_peticion(entrada, *credenciales)).status_code
+        except requests.RequestException:
+            codigo = None
+        with bloqueo:
+            latencias[ruta].append((time.perf_counter() - inicio) * 1000.0)
+            estados[ruta][codigo] += 1
+
+    ts_inicial = entradas[0]['ts'] if entradas else 0
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_hilos) as ejecutor:
+        for entrada in entradas:
+            if velocidad > 0:
+                espera = (entrada['ts'] - ts_inicial) / velocidad - (time.perf_counter() - inicio)
+                if espera > 0:
+                    time.sleep(espera)
+            ejecutor.submit(enviar, entrada)
+    return latencias, estados, time.perf_counter() - inicio
+
+def main():
+    parser = argparse.ArgumentParser(description='Reproduce tráfico capturado en un JSONL')
+    parser.add_argument('archivo', nargs='?', default='requests.jsonl')
+    parser.add_argument('--url', required=True, help='URL base de la instancia a cargar')
+    parser.add_argument('--velocidad', type=float, default=1.0,
+                        help='1 = ritmo original, 2 = el doble de rápido, 0 = sin esperas')
+    parser.add_argument('--usuario', default='replay', help='prefijo de los usuarios (uno por cubeta)')
+    parser.add_argument('--password', default='replay123')
+    parser.add_argument('--max-hilos', type=int, default=64)
+    parser.add_argument('--salida', default='replay_resultados.json')
+    args = parser.parse_args()
+
+    entradas = cargar_entradas(args.archivo)
+    if not entradas:
+        parser.error(f'No hay entradas válidas en {args.archivo}')
+
+    latencias, estados, duracion = reproducir(entradas, args.url.rstrip('/'), args.velocidad,
+                                              args.usuario, args.password, args.max_hilos)
+
+    originales = defaultdict(list)
+    for entrada in entradas:
+        originales[entrada.get('ruta') or entrada['path']].append(entrada.get('duracion_ms') or 0)
+
+    resultados = []
+    for ruta in sorted(latencias):
+        resumen = resumir_latencias(latencias[ruta], duracion, estados[ruta], error_desde=400)
+        original = resumir_latencias(originales[ruta], duracion)
+        resultados.append(dict(ruta=ruta, **resumen, original_p50_ms=original['p50_ms'],
+                               original_p95_ms=original['p95_ms']))
+        print(f"{ruta:<40} n={resumen['peticiones']:<5} p50={resumen['p50_ms']}ms p95={resumen['p95_ms']}ms "
+              f"p99={resumen['p99_ms']}ms (original p50={original['p50_ms']}ms) errores={resumen['errores']}")
+
+    with open(args.salida, 'w') as f:
+        json.dump({
+            'commit': commit_actual(),
+            'fecha': datetime.utcnow().isoformat(),
+            'archivo': args.archivo,
+            'velocidad': args.velocidad,
+            'entradas': len(entradas),
+            'duracion_s': round(duracion, 2),
+            'resultados': resultados
+        }, f, indent=2)
+    print(f'Resultados guardados en {args.salida}')
+
+if __name__ == '__main__':
+    main()
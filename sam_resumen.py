@@ -0,0 +1,161 @@
+import math
+import re
+
+FLAG_PAREADA = 0x1
+FLAG_PAR_CORRECTO = 0x2
+FLAG_NO_MAPEADA = 0x4
+FLAG_SECUNDARIA = 0x100
+FLAG_SUPLEMENTARIA = 0x800
+
+# Operaciones CIGAR: M/=/X cubren la referencia; D/N la avanzan sin cubrirla
+OPERACION_CIGAR = re.compile(rb'(\d+)([MIDNSHP=X])')
+CUBREN = frozenset(b'M=X')
+AVANZAN = frozenset(b'DN')
+
+class ResumenSam:
+    """
+    Resumen incremental de un SAM: se alimenta con bloques de bytes (en cualquier
+    punto de corte) y mantiene solo contadores, así que la memoria no depende del
+    tamaño del alineamiento.
+    """
+
+    def __init__(self, max_bins=1000):
+        self.max_bins = max_bins
+        self.total_lecturas = 0
+        self.mapeadas = 0
+        self.no_mapeadas = 0
+        self.multimapeadas = 0
+        self.pareadas = 0
+        self.pareadas_correctamente = 0
+        self.alineamientos_secundarios = 0
+        self.histograma_mapq = [0] * 256
+        self.referencias = {}        # nombre -> {'longitud', 'tam_bin', 'bins' (bases cubiertas por bin)}
+        self._resto = b''
+
+    def _agregar_referencia(self, linea):
+        campos = dict(c.split(b':', 1) for c in linea.split(b'\t')[1:] if b':' in c)
+        if b'SN' in campos and b'LN' in campos:
+            longitud = int(campos[b'LN'])
+            tam_bin = max(1, math.ceil(longitud / self.max_bins))
+            self.referencias[campos[b'SN'].decode()] = {
+                'longitud': longitud,
+                'tam_bin': tam_bin,
+                'bins': [0] * math.ceil(longitud / tam_bin)
+            }
+
+    def _procesar_lineas(self, lineas):
+        # Bucle caliente: contadores en variables locales y solo los campos necesarios
+        total = mapeadas = no_mapeadas = multimapeadas = pareadas = correctas = secundarias = 0
+        histograma = self.histograma_mapq
+        referencias = self.referencias
+        ultima_ref, bins, tam_bin = None, None, 1
+
+        for linea in lineas:
+            if not linea:
+                continue
+            if linea[0] == 64:   # '@'
+                if linea.startswith(b'@SQ'):
+                    self._agregar_referencia(linea)
+                    ultima_ref = None
+                continue
+
+            # Solo se separan los campos necesarios; el resto de la línea no se trocea
+            _, flag, referencia, posicion, mapq, cigar, _ = linea.split(b'\t', 6)
+            flag = int(flag)
+            if flag & (FLAG_SECUNDARIA | FLAG_SUPLEMENTARIA):
+                secundarias += 1
+                continue
+
+            total += 1
+            if flag & FLAG_PAREADA:
+                pareadas += 1
+            if flag & FLAG_NO_MAPEADA:
+                no_mapeadas += 1
+                continue
+
+            mapeadas += 1
+            histograma[int(mapq)] += 1
+            if flag & FLAG_PAREADA and flag & FLAG_PAR_CORRECTO:
+                correctas += 1
+            # Bowtie2 marca con XS:i las lecturas con alineamientos alternativos
+            if b'\tXS:i:' in linea:
+                multimapeadas += 1
+
+            if referencia != ultima_ref:
+                ultima_ref = referencia
+                ref = referencias.get(referencia.decode())
+                bins, tam_bin = (ref['bins'], ref['tam_bin']) if ref else (None, 1)
+            if bins is not None:
+                inicio = int(posicion) - 1
+                if cigar[-1] == 77 and cigar[:-1].isdigit():   # caso habitual: '100M'
+                    _sumar_cobertura(bins, tam_bin, inicio, inicio + int(cigar[:-1]))
+                else:
+                    for longitud, operacion in OPERACION_CIGAR.findall(cigar):
+                        if operacion[0] in CUBREN:
+                            fin = inicio + int(longitud)
+                            _sumar_cobertura(bins, tam_bin, inicio, fin)
+                            inicio = fin
+                        elif operacion[0] in AVANZAN:
+                            inicio += int(longitud)
+
+        self.total_lecturas += total
+        self.mapeadas += mapeadas
+        self.no_mapeadas += no_mapeadas
+        self.multimapeadas += multimapeadas
+        self.pareadas += pareadas
+        self.pareadas_correctamente += correctas
+        self.alineamientos_secundarios += secundarias
+
+    def procesar_bloque(self, bloque):
+        """Procesa un bloque de bytes; la última línea incompleta se guarda para el siguiente."""
+        lineas = (self._resto + bloque).split(b'\n')
+        self._resto = lineas.pop()
+        self._procesar_lineas(lineas)
+
+    def finalizar(self):
+        """Procesa lo pendiente y devuelve el resumen como dict."""
+        self._procesar_lineas([self._resto])
+        self._resto = b''
+
+        # El histograma se recorta hasta el último MAPQ observado
+        ultimo = max((i for i, v in enumerate(self.histograma_mapq) if v), default=-1)
+        return {
+            'total_lecturas': self.total_lecturas,
+            'mapeadas': self.mapeadas,
+            'no_mapeadas': self.no_mapeadas,
+            'multimapeadas': self.multimapeadas,
+            'pareadas': self.pareadas,
+            'pareadas_correctamente': self.pareadas_correctamente,
+            'tasa_pareadas_correctamente': round(self.pareadas_correctamente / self.pareadas, 4) if self.pareadas else None,
+            'alineamientos_secundarios': self.alineamientos_secundarios,
+            'histograma_mapq': self.histograma_mapq[:ultimo + 1],
+            'cobertura': {
+                nombre: {'longitud': r['longitud'], 'tam_bin': r['tam_bin'],
+                         'profundidad_media': _profundidad_media(r)}
+                for nombre, r in self.referencias.items()
+            }
+        }
+
+def _sumar_cobertura(bins, tam_bin, inicio, fin):
+    """Suma las bases [inicio, fin) de un bloque alineado a los bins que atraviesa."""
+    inicio = max(inicio, 0)
+    fin = min(fin, len(bins) * tam_bin)
+    while inicio < fin:
+        indice = inicio // tam_bin
+        limite = min(fin, (indice + 1) * tam_bin)
+        bins[indice] += limite - inicio
+        inicio = limite
+
+def _profundidad_media(referencia):
+    """Bases cubiertas por bin -> profundidad media (el último bin puede ser más corto)."""
+    longitud, tam_bin = referencia['longitud'], referencia['tam_bin']
+    return [round(bases / min(tam_bin, longitud - i * tam_bin), 3)
+            for i, bases in enumerate(referencia['bins'])]
+
+def resumir_sam(bloques, max_bins=1000):
+    """Resume un SAM recibido como iterable de bloques de bytes."""
+    resumen = ResumenSam(max_bins=max_bins)
+    for bloque in bloques:
+        if bloque:
+            resumen.procesar_bloque(bloque)
+    return resumen.finalizar()
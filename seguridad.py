@@ -0,0 +1,125 @@
+import multiprocessing
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as TimeoutFuturo
+from concurrent.futures.process import BrokenProcessPool
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+class ServidorOcupado(Exception):
+    """La cola de hashing está llena o la operación tardó demasiado."""
+
+class ServicioHash:
+    """
+    Ejecuta el hashing de contraseñas (scrypt/pbkdf2, lento a propósito) en un
+    pool de procesos acotado, para que una ráfaga de logins no ocupe la CPU de
+    los workers web. Si la cola está llena se rechaza de inmediato.
+    """
+
+    def __init__(self, procesos=2, max_pendientes=8, timeout=10, metodo='scrypt'):
+        self.procesos = procesos
+        self.timeout = timeout
+        self.metodo = metodo
+        self._cupos = threading.BoundedSemaphore(procesos + max_pendientes)
+        self._pool = None
+        self._bloqueo = threading.Lock()
+        self._parametros_actuales = None
+
+    def _obtener_pool(self):
+        # El pool se crea en el primer uso (no al importar la app). Sin fork: el proceso web
+        # ya tiene hilos en marcha (barrido del spool, captura de tráfico) y no deben copiarse
+        with self._bloqueo:
+            if self._pool is None:
+                metodo = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+                self._pool = ProcessPoolExecutor(max_workers=self.procesos,
+                                                 mp_context=multiprocessing.get_context(metodo))
+            return self._pool
+
+    def _descartar_pool(self, pool):
+        """Un worker murió (OOM, kill): el pool queda roto para siempre, se recrea en el siguiente uso."""
+        with self._bloqueo:
+            # Otro hilo puede haberlo recreado ya
+            if self._pool is pool:
+                self._pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def _ejecutar(self, funcion, *args, **kwargs):
+        if not self._cupos.acquire(blocking=False):
+            raise ServidorOcupado('Demasiadas operaciones de contraseña en cola')
+        pool = self._obtener_pool()
+        try:
+            futuro = pool.submit(funcion, *args, **kwargs)
+        except BrokenProcessPool:
+            self._cupos.release()
+            self._descartar_pool(pool)
+            raise ServidorOcupado('El servicio de contraseñas se está reiniciando')
+        except Exception:
+            self._cupos.release()
+            raise
+        # El cupo se libera cuando la tarea termina o se cancela, no cuando el llamador deja de
+        # esperar: así nunca hay más de procesos + max_pendientes tareas dentro del pool
+        futuro.add_done_callback(lambda _: self._cupos.release())
+        try:
+            return futuro.result(timeout=self.timeout)
+        except TimeoutFuturo:
+            futuro.cancel()
+            raise ServidorOcupado('La verificación de la contraseña tardó demasiado')
+        except BrokenProcessPool:
+            self._descartar_pool(pool)
+            raise ServidorOcupado('El servicio de contraseñas se está reiniciando')
+
+    def verificar(self, hash_guardado, password):
+        return self._ejecutar(check_password_hash, hash_guardado, password)
+
+    def generar(self, password):
+        return self._ejecutar(generate_password_hash, password, method=self.metodo)
+
+    def necesita_rehash(self, hash_guardado):
+        """True si el hash se generó con otro método o con parámetros distintos a los actuales."""
+        if self._parametros_actuales is None:
+            self._parametros_actuales = self.generar('').split('$', 1)[0]
+        return hash_guardado.split('$', 1)[0] != self._parametros_actuales
+
+class LimitadorIntentos:
+    """Ventana deslizante en memoria: como mucho `max_intentos` por clave cada `ventana` segundos."""
+
+    def __init__(self, max_intentos, ventana):
+        self.max_intentos = max_intentos
+        self.ventana = ventana
+        self._intentos = defaultdict(deque)
+        self._bloqueo = threading.Lock()
+        self._ultima_limpieza = time.monotonic()
+
+    def _purgar(self, marcas, ahora):
+        while marcas and marcas[0] <= ahora - self.ventana:
+            marcas.popleft()
+
+    def _limpiar(self, ahora):
+        """Elimina claves sin intentos recientes para que la memoria no crezca sin límite."""
+        if ahora - self._ultima_limpieza < self.ventana:
+            return
+        self._ultima_limpieza = ahora
+        for clave in list(self._intentos):
+            self._purgar(self._intentos[clave], ahora)
+            if not self._intentos[clave]:
+                del self._intentos[clave]
+
+    def excedido(self, clave):
+        ahora = time.monotonic()
+        with self._bloqueo:
+            marcas = self._intentos.get(clave)
+            if not marcas:
+                return False
+            self._purgar(marcas, ahora)
+            return len(marcas) >= self.max_intentos
+
+    def registrar(self, clave):
+        ahora = time.monotonic()
+        with self._bloqueo:
+            self._limpiar(ahora)
+            self._intentos[clave].append(ahora)
+
+    def reiniciar(self, clave):
+        with self._bloqueo:
+            self._intentos.pop(clave, None)
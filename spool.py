@@ -0,0 +1,242 @@
+import fcntl
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from werkzeug.utils import secure_filename
+
+# Cada subida vive en su propio subdirectorio <uuid hex>/<nombre original>
+_PATRON_SUBIDA = re.compile(r'^[0-9a-f]{32}$')
+# Marcas dentro del subdirectorio: bytes reservados y confirmación (su mtime es el último acceso)
+_RESERVA = '.reserva'
+_CONFIRMADO = '.confirmado'
+# Las subidas sin Content-Length amplían su reserva por tramos de este tamaño
+_AMPLIACION = 8 * 1024 * 1024
+
+class EspacioInsuficiente(Exception):
+    """No hay espacio en el spool para la subida, ni siquiera tras esperar y desalojar."""
+
+class SpoolSubidas:
+    """
+    Carpeta temporal gestionada para las subidas a Galaxy:
+    - una ruta única por subida (dos usuarios con el mismo nombre de archivo no se pisan),
+    - cuota global de disco con back-pressure (espera a que se libere espacio o rechaza),
+    - desalojo por TTL y LRU de los archivos que Galaxy ya recibió,
+    - barrido periódico en un hilo de fondo,
+    - opcionalmente, los archivos pequeños van a un directorio en tmpfs.
+
+    El estado (reservas y confirmaciones) vive en disco junto a cada subida y se
+    modifica bajo un lock de archivo, así que la cuota es común a todos los
+    workers y sobrevive a los reinicios.
+    """
+
+    def __init__(self, directorio, cuota_bytes, ttl_segundos=3600, espera_maxima=30,
+                 directorio_tmpfs=None, umbral_tmpfs=0):
+        self.directorio = directorio
+        self.cuota_bytes = cuota_bytes
+        self.ttl_segundos = ttl_segundos
+        self.espera_maxima = espera_maxima
+        self.directorio_tmpfs = directorio_tmpfs
+        self.umbral_tmpfs = umbral_tmpfs
+        self._bases = [b for b in (directorio, directorio_tmpfs) if b]
+        self._ruta_lock = os.path.join(directorio, '.spool.lock')
+        self._bloqueo_hilos = threading.Lock()
+        self._hilo_barrido = None
+
+        for base in self._bases:
+            os.makedirs(base, exist_ok=True)
+
+    @contextmanager
+    def _exclusivo(self):
+        """Lock entre hilos (threading) y entre procesos (flock sobre .spool.lock)."""
+        with self._bloqueo_hilos, open(self._ruta_lock, 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _subidas(self):
+        """Estado de cada subida en disco: {carpeta: {'tamano', 'confirmado_en', 'modificado_en'}}."""
+        subidas = {}
+        for base in self._bases:
+            for entrada in os.scandir(base):
+                if not (entrada.is_dir() and _PATRON_SUBIDA.match(entrada.name)):
+                    continue
+                reservado, ocupado, confirmado_en = 0, 0, None
+                modificado_en = entrada.stat().st_mtime
+                try:
+                    for archivo in os.scandir(entrada.path):
+                        info = archivo.stat()
+                        modificado_en = max(modificado_en, info.st_mtime)
+                        if archivo.name == _RESERVA:
+                            with open(archivo.path) as f:
+                                reservado = int(f.read() or 0)
+                        elif archivo.name == _CONFIRMADO:
+                            confirmado_en = info.st_mtime
+                        else:
+                            ocupado += info.st_size
+                except (OSError, ValueError):
+                    continue    # Otra petición la está borrando
+                subidas[entrada.path] = {'tamano': max(reservado, ocupado), 'confirmado_en': confirmado_en,
+                                         'modificado_en': modificado_en}
+        return subidas
+
+    def _desalojar_lru(self, subidas, necesario):
+        """Borra subidas confirmadas, de la menos usada a la más usada, hasta que quepan `necesario` bytes."""
+        uso = sum(s['tamano'] for s in subidas.values())
+        confirmadas = sorted((s['confirmado_en'], carpeta) for carpeta, s in subidas.items() if s['confirmado_en'])
+        for _, carpeta in confirmadas:
+            if uso + necesario <= self.cuota_bytes:
+                break
+            shutil.rmtree(carpeta, ignore_errors=True)
+            uso -= subidas.pop(carpeta)['tamano']
+        return uso
+
+    def _escribir_reserva(self, carpeta, tamano):
+        with open(os.path.join(carpeta, _RESERVA), 'w') as f:
+            f.write(str(tamano))
+
+    def reservar(self, nombre_original, tamano_estimado, tamano_conocido=True):
+        """
+        Reserva espacio y devuelve una ruta única para la subida.
+        Si la cuota está llena espera hasta `espera_maxima` segundos y luego lanza EspacioInsuficiente.
+        """
+        if tamano_estimado > self.cuota_bytes:
+            raise EspacioInsuficiente('El archivo supera la cuota total del spool')
+
+        base = self.directorio
+        # Una subida de tamaño desconocido podría crecer sin límite: nunca va a tmpfs
+        if self.directorio_tmpfs and tamano_conocido and tamano_estimado <= self.umbral_tmpfs:
+            base = self.directorio_tmpfs
+        carpeta = os.path.join(base, uuid.uuid4().hex)
+
+        # Otros workers liberan espacio sin poder avisarnos: se reintenta cada medio segundo
+        limite = time.monotonic() + self.espera_maxima
+        while True:
+            with self._exclusivo():
+                if self._desalojar_lru(self._subidas(), tamano_estimado) + tamano_estimado <= self.cuota_bytes:
+                    os.makedirs(carpeta)
+                    self._escribir_reserva(carpeta, tamano_estimado)
+                    break
+            if time.monotonic() >= limite:
+                raise EspacioInsuficiente('El spool de subidas está lleno, inténtelo más tarde')
+            time.sleep(0.5)
+
+        return os.path.join(carpeta, secure_filename(nombre_original) or 'archivo')
+
+    def _ampliar(self, ruta, tamano):
+        """Amplía la reserva de una subida en curso si la cuota lo permite (sin esperar)."""
+        carpeta = os.path.dirname(ruta)
+        with self._exclusivo():
+            subidas = self._subidas()
+            actual = subidas.get(carpeta, {}).get('tamano', 0)
+            if self._desalojar_lru(subidas, tamano - actual) + tamano - actual > self.cuota_bytes:
+                raise EspacioInsuficiente('El spool de subidas está lleno, inténtelo más tarde')
+            self._escribir_reserva(carpeta, tamano)
+
+    def abrir(self, nombre_original, tamano_estimado=None):
+        """
+        Reserva una ruta y devuelve un FlujoSpool donde escribir la subida a medida que llega.
+        Con `tamano_estimado` (Content-Length) la subida no puede superar lo reservado; sin él,
+        la reserva se amplía por tramos mientras la cuota lo permita.
+        """
+        fijo = bool(tamano_estimado)
+        reservado = tamano_estimado if fijo else _AMPLIACION
+        ruta = self.reservar(nombre_original or 'archivo', reservado, tamano_conocido=fijo)
+        return FlujoSpool(self, ruta, reservado, fijo)
+
+    def cerrar(self, flujo):
+        """Cierra una subida ya recibida, ajusta la reserva a su tamaño real y devuelve su ruta."""
+        flujo.close()
+        flujo.conservar = True
+        with self._exclusivo():
+            self._escribir_reserva(os.path.dirname(flujo.ruta), flujo.escrito)
+        return flujo.ruta
+
+    def confirmar(self, ruta):
+        """Galaxy ya recibió el archivo: a partir de ahora puede desalojarse por TTL o LRU."""
+        self.tocar(ruta, crear=True)
+
+    def tocar(self, ruta, crear=False):
+        """Marca una subida confirmada como usada recientemente (p. ej. al reintentar la subida)."""
+        marca = os.path.join(os.path.dirname(ruta), _CONFIRMADO)
+        with self._exclusivo():
+            if crear or os.path.exists(marca):
+                try:
+                    with open(marca, 'a'):
+                        os.utime(marca)
+                except FileNotFoundError:
+                    pass    # Ya se desalojó
+
+    def liberar(self, ruta):
+        """Elimina inmediatamente una subida (confirmada o no)."""
+        with self._exclusivo():
+            shutil.rmtree(os.path.dirname(ruta), ignore_errors=True)
+
+    def barrer(self):
+        """
+        Elimina las subidas confirmadas con más de `ttl_segundos` y las sin confirmar que llevan
+        ese tiempo sin escribirse (restos de un worker caído). Devuelve cuántas borró.
+        """
+        limite = time.time() - self.ttl_segundos
+        with self._exclusivo():
+            caducadas = [carpeta for carpeta, s in self._subidas().items()
+                         if (s['confirmado_en'] or s['modificado_en']) < limite]
+            for carpeta in caducadas:
+                shutil.rmtree(carpeta, ignore_errors=True)
+        return len(caducadas)
+
+    def iniciar_barrido(self, intervalo=300):
+        """Lanza (una sola vez) el hilo de fondo que ejecuta barrer() cada `intervalo` segundos."""
+        if self._hilo_barrido and self._hilo_barrido.is_alive():
+            return
+
+        def ciclo():
+            while True:
+                time.sleep(intervalo)
+                try:
+                    self.barrer()
+                except Exception as e:
+                    print(f"Error en el barrido del spool: {e}")
+
+        self._hilo_barrido = threading.Thread(target=ciclo, name='barrido-spool', daemon=True)
+        self._hilo_barrido.start()
+
+class FlujoSpool:
+    """
+    Archivo del spool en el que se escribe una subida mientras se recibe: cada write()
+    comprueba la reserva, así la cuota se aplica antes de tener el cuerpo completo.
+    """
+
+    def __init__(self, spool, ruta, reservado, fijo):
+        self.spool = spool
+        self.ruta = ruta
+        self.reservado = reservado
+        self.fijo = fijo
+        self.escrito = 0
+        self.conservar = False      # False: se libera al terminar la petición (ver liberar_si_pendiente)
+        self._archivo = open(ruta, 'w+b')
+
+    def write(self, datos):
+        self.escrito += len(datos)
+        if self.escrito > self.reservado:
+            if self.fijo:
+                raise EspacioInsuficiente('El archivo es mayor que el tamaño declarado')
+            self.reservado = self.escrito + _AMPLIACION
+            self.spool._ampliar(self.ruta, self.reservado)
+        return self._archivo.write(datos)
+
+    def liberar_si_pendiente(self):
+        """Borra la subida si nadie llamó a SpoolSubidas.cerrar() (petición rechazada o fallida)."""
+        self._archivo.close()
+        if not self.conservar:
+            self.spool.liberar(self.ruta)
+
+    def __getattr__(self, nombre):
+        # read, seek, tell, close... del archivo real
+        return getattr(self._archivo, nombre)